@@ -0,0 +1,377 @@
+# Agregação do risco da malha viária por hexágono H3
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import geopandas as gpd
+import h3
+import numpy as np
+import pandas as pd
+import shapely
+from scipy import sparse
+from h3.api import numpy_int as h3_int
+
+# Colunas de risco dos segmentos (diurno e noturno)
+COLUNAS_RISCO = ["KmP", "KmP_dark"]
+
+# Resoluções H3 da pirâmide usada pelo mapa conforme o zoom
+RESOLUCOES_PIRAMIDE = range(5, 10)
+
+# Resolução das células pai que definem as partições do cálculo em paralelo
+RESOLUCAO_PARTICAO = 3
+
+
+def pares_hexagono_segmento(hexagonos, malha_viaria):
+    """Retorna as posições (hexágono, segmento) de todos os pares que se intersectam.
+
+    A consulta usa a STRtree da malha viária (`sindex`), então cada hexágono
+    só é comparado com os segmentos cujo envelope o toca.
+    """
+    idx_hex, idx_seg = malha_viaria.sindex.query(hexagonos.geometry, predicate="intersects")
+    return idx_hex, idx_seg
+
+
+def calcular_risco_hexagonos(hexagonos, malha_viaria, colunas=COLUNAS_RISCO):
+    """Calcula `risk_mean_<col>` e `risk_mean_rounded_<col>` para todos os hexágonos de uma vez.
+
+    Equivale ao laço antigo com `iterrows()` + `intersects`: média simples dos
+    segmentos que tocam o hexágono e 0 quando não há nenhum segmento.
+    """
+    idx_hex, idx_seg = pares_hexagono_segmento(hexagonos, malha_viaria)
+    medias, tem_segmento = _media_pares(idx_hex, idx_seg, malha_viaria[colunas].to_numpy(dtype=float), len(hexagonos))
+    return _preencher_risco(hexagonos, medias, tem_segmento, colunas)
+
+
+def _media_pares(idx_hex, idx_seg, valores, n_hexagonos):
+    """Média simples, ignorando NaN, dos `valores` dos segmentos de cada hexágono nos pares (hexágono, segmento).
+
+    Retorna (medias, tem_segmento); hexágonos sem nenhum par ficam com NaN.
+    """
+    matriz = sparse.csr_matrix((np.ones(len(idx_hex)), (idx_hex, idx_seg)), shape=(n_hexagonos, len(valores)))
+    tem_segmento = np.bincount(idx_hex, minlength=n_hexagonos) > 0
+    return agregar_segmentos(matriz, valores, "media"), tem_segmento
+
+
+def _preencher_risco(hexagonos, medias, tem_segmento, colunas):
+    """Cópia de `hexagonos` com `risk_mean_<col>` e `risk_mean_rounded_<col>` a partir de `medias`.
+
+    Hexágonos sem segmentos recebem risco 0, como no cálculo original.
+    """
+    resultado = hexagonos.copy()
+    for k, coluna in enumerate(colunas):
+        media = np.where(tem_segmento, medias[:, k], 0.0)
+        resultado[f"risk_mean_{coluna}"] = media
+        resultado[f"risk_mean_rounded_{coluna}"] = np.round(media)
+    return resultado
+
+
+def matriz_pertinencia(hexagonos, malha_viaria, crs_metrico=None):
+    """Matriz CSR (hexágonos x segmentos) com o comprimento, em metros, de cada segmento em cada hexágono.
+
+    Hexágonos e segmentos são projetados para um CRS métrico (UTM estimado, se
+    `crs_metrico` não for dado), os pares candidatos saem da STRtree e só os
+    segmentos que cruzam a borda são recortados. Segmentos que apenas tocam a
+    borda ficam como entradas explícitas de valor 0, para que a estrutura da
+    matriz reproduza o `intersects` do cálculo original.
+    """
+    if crs_metrico is None:
+        crs_metrico = hexagonos.estimate_utm_crs()
+    geometrias_hex = hexagonos.geometry.to_crs(crs_metrico).values
+    geometrias_seg = malha_viaria.geometry.to_crs(crs_metrico).values
+
+    idx_hex, idx_seg = shapely.STRtree(geometrias_seg).query(geometrias_hex, predicate="intersects")
+    ordem = np.lexsort((idx_seg, idx_hex))
+    idx_hex, idx_seg = idx_hex[ordem], idx_seg[ordem]
+
+    # Os segmentos inteiramente dentro do hexágono entram com o comprimento total
+    shapely.prepare(geometrias_hex)
+    comprimentos = shapely.length(geometrias_seg)[idx_seg]
+    cruza = ~shapely.contains_properly(geometrias_hex[idx_hex], geometrias_seg[idx_seg])
+    comprimentos[cruza] = shapely.length(
+        shapely.intersection(geometrias_seg[idx_seg[cruza]], geometrias_hex[idx_hex[cruza]])
+    )
+
+    # Construída direto de (data, indices, indptr) para manter os zeros explícitos
+    indptr = np.concatenate([[0], np.cumsum(np.bincount(idx_hex, minlength=len(hexagonos)))])
+    return sparse.csr_matrix((comprimentos, idx_seg, indptr), shape=(len(hexagonos), len(malha_viaria)))
+
+
+def agregar_segmentos(matriz, valores, estatistica="media"):
+    """Agrega atributos dos segmentos por hexágono a partir da `matriz_pertinencia`.
+
+    `valores` tem uma linha por segmento (uma ou mais colunas). `estatistica`:
+    "media" (simples, como o `intersects` original), "media_comprimento"
+    (ponderada pelo comprimento dentro do hexágono), "soma" ou "max". NaN é
+    ignorado; hexágonos sem segmento válido (ou sem comprimento, na média
+    ponderada) ficam com NaN.
+    """
+    valores = np.asarray(valores, dtype=float)
+    unidimensional = valores.ndim == 1
+    if unidimensional:
+        valores = valores[:, None]
+    validos = ~np.isnan(valores)
+    zerados = np.where(validos, valores, 0.0)
+
+    pesos = matriz
+    if estatistica != "media_comprimento":
+        pesos = sparse.csr_matrix((np.ones_like(matriz.data), matriz.indices, matriz.indptr), shape=matriz.shape)
+
+    quantidade = pesos @ validos.astype(float)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        if estatistica in ("media", "media_comprimento"):
+            resultado = (pesos @ zerados) / quantidade
+        elif estatistica == "soma":
+            resultado = np.where(quantidade > 0, pesos @ zerados, np.nan)
+        elif estatistica == "max":
+            resultado = np.full((matriz.shape[0], valores.shape[1]), np.nan)
+            com_segmento = np.flatnonzero(np.diff(matriz.indptr) > 0)
+            if len(com_segmento):
+                resultado[com_segmento] = np.fmax.reduceat(
+                    np.where(validos, valores, np.nan)[matriz.indices], matriz.indptr[com_segmento], axis=0
+                )
+        else:
+            raise ValueError(f"Estatística desconhecida: {estatistica}")
+    return resultado[:, 0] if unidimensional else resultado
+
+
+def calcular_risco_hexagonos_comprimento(hexagonos, malha_viaria, colunas=COLUNAS_RISCO, crs_metrico=None,
+                                         matriz=None):
+    """Risco médio por hexágono ponderado pelo comprimento de cada segmento dentro dele.
+
+    Usa a `matriz_pertinencia` (recebida pronta ou calculada aqui): todas as
+    `colunas` saem de um único produto matriz esparsa x valores. Hexágonos sem
+    nenhum comprimento recebem 0, como nos demais métodos.
+    """
+    if matriz is None:
+        matriz = matriz_pertinencia(hexagonos, malha_viaria, crs_metrico)
+    medias = agregar_segmentos(matriz, malha_viaria[colunas].to_numpy(dtype=float), "media_comprimento")
+    tem_segmento = np.asarray(matriz.sum(axis=1)).ravel() > 0
+    return _preencher_risco(hexagonos, medias, tem_segmento, colunas)
+
+
+def _amostrar_linhas(geometrias, passo):
+    """Pontos ao longo das linhas com espaçamento máximo `passo` (em graus).
+
+    Retorna (lon, lat, posição do segmento). Os vértices originais são mantidos
+    e cada trecho entre dois vértices recebe pontos intermediários suficientes.
+    """
+    partes, idx_parte_seg = shapely.get_parts(geometrias, return_index=True)
+    coords, idx_coord_parte = shapely.get_coordinates(partes, return_index=True)
+    idx_seg = idx_parte_seg[idx_coord_parte]
+
+    # Trechos entre vértices consecutivos da mesma parte
+    mesma_parte = idx_coord_parte[1:] == idx_coord_parte[:-1]
+    inicio = coords[:-1][mesma_parte]
+    delta = coords[1:][mesma_parte] - inicio
+    seg_trecho = idx_seg[:-1][mesma_parte]
+
+    n = np.maximum(np.ceil(np.hypot(delta[:, 0], delta[:, 1]) / passo).astype(np.int64), 1)
+    trecho = np.repeat(np.arange(len(n)), n)
+    k = np.arange(len(trecho)) - np.repeat(np.cumsum(n) - n, n)
+    pontos = inicio[trecho] + (k / n[trecho])[:, None] * delta[trecho]
+
+    pontos = np.vstack([pontos, coords])
+    seg_pontos = np.concatenate([seg_trecho[trecho], idx_seg])
+    return pontos[:, 0], pontos[:, 1], seg_pontos
+
+
+def celulas_por_segmento(malha_viaria, resolucao=6, fracao_passo=0.1):
+    """Pares únicos (célula H3 inteira, posição do segmento) percorridos pela malha.
+
+    As linhas são amostradas a cada `fracao_passo` da aresta média da resolução,
+    então trechos que apenas raspam o canto de uma célula podem não ser contados.
+    A geometria só é lida uma vez (coordenadas); a atribuição é feita pelo H3.
+    """
+    passo = fracao_passo * h3.average_hexagon_edge_length(resolucao, unit="km") / 111.32
+    lon, lat, seg = _amostrar_linhas(malha_viaria.geometry.values, passo)
+    celulas = np.fromiter(
+        (h3_int.latlng_to_cell(y, x, resolucao) for x, y in zip(lon.tolist(), lat.tolist())),
+        dtype=np.uint64,
+        count=len(lon),
+    )
+    pares = pd.DataFrame({"celula": celulas, "segmento": seg}).drop_duplicates()
+    return pares["celula"].to_numpy(), pares["segmento"].to_numpy()
+
+
+def calcular_risco_hexagonos_h3(hexagonos, malha_viaria, colunas=COLUNAS_RISCO, resolucao=None, fracao_passo=0.1):
+    """Versão de `calcular_risco_hexagonos` baseada no `index` H3 dos hexágonos.
+
+    Cada segmento é convertido nas células que atravessa e a média é feita por
+    id de célula (inteiro), sem interseção de polígonos. Difere do cálculo por
+    interseção apenas em segmentos que tocam a borda de uma célula. Sem
+    `resolucao`, usa a dos próprios hexágonos.
+    """
+    if resolucao is None:
+        resolucao = h3.get_resolution(hexagonos["index"].iloc[0])
+    celulas, idx_seg = celulas_por_segmento(malha_viaria, resolucao, fracao_passo)
+
+    # Posição de cada célula entre os hexágonos; células fora da camada são descartadas
+    ids_hexagonos = np.array([int(indice, 16) for indice in hexagonos["index"]], dtype=np.uint64)
+    idx_hex = pd.Index(ids_hexagonos).get_indexer(celulas)
+    dentro = idx_hex >= 0
+    medias, tem_segmento = _media_pares(
+        idx_hex[dentro], idx_seg[dentro], malha_viaria[colunas].to_numpy(dtype=float), len(hexagonos)
+    )
+    return _preencher_risco(hexagonos, medias, tem_segmento, colunas)
+
+
+def celulas_na_resolucao(indices, resolucao):
+    """Células H3 em `resolucao` que cobrem as células `indices` (pais, se mais grossa; filhas, se mais fina)."""
+    if resolucao <= h3.get_resolution(indices[0]):
+        return sorted({h3.cell_to_parent(indice, resolucao) for indice in indices})
+    return [filha for indice in indices for filha in h3.cell_to_children(indice, resolucao)]
+
+
+def poligonos_celulas(indices):
+    """Polígonos (lng, lat) das células H3 `indices`."""
+    # cell_to_boundary retorna (lat, lng); o GeoJSON espera (lng, lat)
+    contornos = [h3.cell_to_boundary(indice) for indice in indices]
+    vertices = np.fromiter((len(contorno) for contorno in contornos), dtype=np.int64, count=len(contornos))
+    coordenadas = np.array([ponto for contorno in contornos for ponto in contorno]).reshape(-1, 2)[:, ::-1]
+    return shapely.polygons(shapely.linearrings(coordenadas, indices=np.repeat(np.arange(len(contornos)), vertices)))
+
+
+def calcular_piramide_h3(hexagonos, malha_viaria, resolucoes=RESOLUCOES_PIRAMIDE, colunas=COLUNAS_RISCO,
+                         calcular=calcular_risco_hexagonos):
+    """Risco médio por célula H3 em várias resoluções, sobre a área coberta por `hexagonos` (H3.geojson).
+
+    Cada nível tem os pais (resoluções mais grossas) ou as filhas (mais finas)
+    das células da camada base, inclusive as sem segmento (risco 0), e o risco
+    é calculado por `calcular`, o mesmo método da camada base. Retorna um único
+    GeoDataFrame com a coluna `resolucao`.
+    """
+    indices_base = list(hexagonos["index"])
+    niveis = []
+    for resolucao in resolucoes:
+        indices = celulas_na_resolucao(indices_base, resolucao)
+        nivel = gpd.GeoDataFrame(
+            {"index": indices, "resolucao": resolucao}, geometry=poligonos_celulas(indices), crs=hexagonos.crs
+        )
+        niveis.append(calcular(nivel, malha_viaria, colunas))
+
+    return gpd.GeoDataFrame(pd.concat(niveis, ignore_index=True), geometry="geometry", crs=hexagonos.crs)
+
+
+def hexagonos_afetados(hexagonos, malha_anterior, malha_nova, coluna_id, colunas=COLUNAS_RISCO):
+    """Posições dos hexágonos tocados por segmentos removidos, adicionados ou alterados.
+
+    Os segmentos são casados por `coluna_id` (que precisa ser única nas duas
+    versões); um segmento conta como alterado se a geometria ou algum valor de
+    `colunas` mudou. Entram a geometria antiga e a nova de cada alteração.
+    """
+    anterior = malha_anterior.set_index(coluna_id)
+    nova = malha_nova.set_index(coluna_id)
+    if not anterior.index.is_unique or not nova.index.is_unique:
+        raise ValueError(f"A coluna '{coluna_id}' tem valores repetidos")
+
+    comuns = anterior.index.intersection(nova.index)
+    geometria_mudou = ~anterior.geometry.loc[comuns].geom_equals_exact(nova.geometry.loc[comuns], tolerance=0)
+    valores_antigos = anterior.loc[comuns, colunas]
+    valores_novos = nova.loc[comuns, colunas]
+    valor_mudou = ~((valores_antigos == valores_novos) | (valores_antigos.isna() & valores_novos.isna())).all(axis=1)
+    alterados = comuns[geometria_mudou.to_numpy() | valor_mudou.to_numpy()]
+
+    saiu = anterior.index.difference(nova.index).union(alterados)
+    entrou = nova.index.difference(anterior.index).union(alterados)
+    geometrias = np.concatenate([anterior.geometry.loc[saiu].values, nova.geometry.loc[entrou].values])
+    if len(geometrias) == 0:
+        return np.array([], dtype=np.int64)
+    _, posicoes = hexagonos.sindex.query(geometrias, predicate="intersects")
+    return np.unique(posicoes)
+
+
+def recalcular_hexagonos(hexagonos_com_risco, posicoes, malha_viaria, colunas=COLUNAS_RISCO,
+                         calcular=calcular_risco_hexagonos):
+    """Cópia de `hexagonos_com_risco` com o risco refeito apenas nas `posicoes` indicadas."""
+    resultado = hexagonos_com_risco.copy()
+    if len(posicoes) == 0:
+        return resultado
+    recalculados = calcular(hexagonos_com_risco.iloc[posicoes], malha_viaria, colunas)
+    for coluna in colunas:
+        for nome in (f"risk_mean_{coluna}", f"risk_mean_rounded_{coluna}"):
+            valores = resultado[nome].to_numpy(dtype=float, copy=True)
+            valores[posicoes] = recalculados[nome].to_numpy()
+            resultado[nome] = valores
+    return resultado
+
+
+def _gravar_wkb(geometrias, pasta, nome):
+    # WKB concatenado + deslocamentos, lidos pelos processos via memmap
+    wkb = shapely.to_wkb(geometrias)
+    tamanhos = np.fromiter((len(g) for g in wkb), dtype=np.int64, count=len(wkb))
+    np.save(os.path.join(pasta, f"{nome}_deslocamentos.npy"), np.concatenate([[0], np.cumsum(tamanhos)]))
+    with open(os.path.join(pasta, f"{nome}.wkb"), "wb") as arquivo:
+        arquivo.write(b"".join(wkb))
+
+
+def _ler_wkb(pasta, nome, posicoes):
+    dados = np.memmap(os.path.join(pasta, f"{nome}.wkb"), dtype=np.uint8, mode="r")
+    deslocamentos = np.load(os.path.join(pasta, f"{nome}_deslocamentos.npy"), mmap_mode="r")
+    inicio, fim = deslocamentos[posicoes], deslocamentos[posicoes + 1]
+    return shapely.from_wkb([dados[a:b].tobytes() for a, b in zip(inicio, fim)])
+
+
+_pasta_compartilhada = None
+
+
+def _iniciar_processo(pasta):
+    global _pasta_compartilhada
+    _pasta_compartilhada = pasta
+
+
+def _agregar_particao(tarefa):
+    """Executado em cada processo: médias dos segmentos candidatos para uma partição."""
+    posicoes_hex, posicoes_seg = tarefa
+    hexagonos = _ler_wkb(_pasta_compartilhada, "hexagonos", posicoes_hex)
+    segmentos = _ler_wkb(_pasta_compartilhada, "segmentos", posicoes_seg)
+    valores = np.load(os.path.join(_pasta_compartilhada, "valores.npy"), mmap_mode="r")[posicoes_seg]
+
+    idx_hex, idx_seg = shapely.STRtree(segmentos).query(hexagonos, predicate="intersects")
+
+    medias, tem_segmento = _media_pares(idx_hex, idx_seg, np.asarray(valores), len(posicoes_hex))
+    return posicoes_hex, medias, tem_segmento
+
+
+def calcular_risco_hexagonos_paralelo(hexagonos, malha_viaria, colunas=COLUNAS_RISCO, processos=None,
+                                      resolucao_particao=RESOLUCAO_PARTICAO):
+    """Mesmo resultado de `calcular_risco_hexagonos`, distribuído em um ProcessPoolExecutor.
+
+    Os hexágonos são divididos pela célula H3 pai (`resolucao_particao`) e cada
+    partição recebe só os segmentos candidatos do seu envelope. As geometrias
+    e os valores vão para um diretório temporário (WKB + .npy) que os processos
+    leem por memmap, sem serializar GeoDataFrames entre processos.
+    """
+    pais = [h3.cell_to_parent(indice, resolucao_particao) for indice in hexagonos["index"]]
+    codigos, _ = pd.factorize(pd.Series(pais))
+    ordem = np.argsort(codigos, kind="stable")
+    limites = np.flatnonzero(np.diff(codigos[ordem])) + 1
+
+    tarefas = []
+    for posicoes_hex in np.split(ordem, limites):
+        envelope = shapely.box(*shapely.total_bounds(hexagonos.geometry.values[posicoes_hex]))
+        posicoes_seg = np.sort(malha_viaria.sindex.query(envelope, predicate="intersects"))
+        # Partições sem segmento candidato ficam com risco 0 sem passar pelos processos
+        if len(posicoes_seg):
+            tarefas.append((posicoes_hex, posicoes_seg))
+
+    medias = np.full((len(hexagonos), len(colunas)), np.nan)
+    tem_segmento = np.zeros(len(hexagonos), dtype=bool)
+    with tempfile.TemporaryDirectory() as pasta:
+        _gravar_wkb(hexagonos.geometry.values, pasta, "hexagonos")
+        _gravar_wkb(malha_viaria.geometry.values, pasta, "segmentos")
+        np.save(os.path.join(pasta, "valores.npy"), malha_viaria[colunas].to_numpy(dtype=float))
+        with ProcessPoolExecutor(processos, initializer=_iniciar_processo, initargs=(pasta,)) as executor:
+            for posicoes_hex, medias_particao, tem_particao in executor.map(_agregar_particao, tarefas):
+                medias[posicoes_hex] = medias_particao
+                tem_segmento[posicoes_hex] = tem_particao
+
+    return _preencher_risco(hexagonos, medias, tem_segmento, colunas)
+
+
+# Métodos de agregação disponíveis para o cache e para a linha de comando
+METODOS = {
+    "intersecao": calcular_risco_hexagonos,
+    "comprimento": calcular_risco_hexagonos_comprimento,
+    "h3": calcular_risco_hexagonos_h3,
+    "paralelo": calcular_risco_hexagonos_paralelo,
+}
@@ -0,0 +1,71 @@
+# Benchmark: laço iterrows/intersects original x agregação com STRtree + groupby
+#
+# Uso: python benchmarks/bench_agregacao.py [--roads Risco3.geojson] [--segmentos 5000]
+import argparse
+import os
+import sys
+import time
+
+import geopandas as gpd
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agregacao_risco import calcular_risco_hexagonos, calcular_risco_hexagonos_h3  # noqa: E402
+from malha_sintetica import carregar_malha  # noqa: E402
+
+
+def calcular_risco_laco(hexagonos_h3, malha_viaria):
+    # Cópia do cálculo original de test_rj19.py, usada como referência
+    hexagonos_h3 = hexagonos_h3.copy()
+    for index, row in hexagonos_h3.iterrows():
+        segmentos_no_hex = malha_viaria[malha_viaria.intersects(row.geometry)]
+
+        if not segmentos_no_hex.empty:
+            hexagonos_h3.loc[index, 'risk_mean_KmP'] = segmentos_no_hex['KmP'].mean()
+            hexagonos_h3.loc[index, 'risk_mean_rounded_KmP'] = segmentos_no_hex['KmP'].mean().round()
+            hexagonos_h3.loc[index, 'risk_mean_KmP_dark'] = segmentos_no_hex['KmP_dark'].mean()
+            hexagonos_h3.loc[index, 'risk_mean_rounded_KmP_dark'] = segmentos_no_hex['KmP_dark'].mean().round()
+        else:
+            hexagonos_h3.loc[index, 'risk_mean_KmP'] = 0
+            hexagonos_h3.loc[index, 'risk_mean_rounded_KmP'] = 0
+            hexagonos_h3.loc[index, 'risk_mean_KmP_dark'] = 0
+            hexagonos_h3.loc[index, 'risk_mean_rounded_KmP_dark'] = 0
+    return hexagonos_h3
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--roads", default="Risco3.geojson")
+    parser.add_argument("--hex", default="H3.geojson")
+    parser.add_argument("--segmentos", type=int, default=5000)
+    args = parser.parse_args()
+
+    hexagonos_h3 = gpd.read_file(args.hex)
+    malha_viaria = carregar_malha(args.roads, hexagonos_h3, args.segmentos)
+    print(f"{len(hexagonos_h3)} hexágonos, {len(malha_viaria)} segmentos")
+
+    inicio = time.perf_counter()
+    referencia = calcular_risco_laco(hexagonos_h3, malha_viaria)
+    tempo_laco = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    resultado = calcular_risco_hexagonos(hexagonos_h3, malha_viaria)
+    tempo_vetorizado = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    resultado_h3 = calcular_risco_hexagonos_h3(hexagonos_h3, malha_viaria)
+    tempo_h3 = time.perf_counter() - inicio
+
+    for coluna in ["risk_mean_KmP", "risk_mean_rounded_KmP", "risk_mean_KmP_dark", "risk_mean_rounded_KmP_dark"]:
+        np.testing.assert_allclose(resultado[coluna], referencia[coluna].astype(float))
+    concordancia = (resultado_h3["risk_mean_rounded_KmP"] == referencia["risk_mean_rounded_KmP"]).mean()
+
+    print(f"laço iterrows:  {tempo_laco:8.3f} s")
+    print(f"sindex+groupby: {tempo_vetorizado:8.3f} s  ({tempo_laco / tempo_vetorizado:.1f}x)")
+    print(f"células H3:     {tempo_h3:8.3f} s  ({tempo_laco / tempo_h3:.1f}x, "
+          f"{concordancia:.1%} das classes iguais ao laço)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+# Benchmark: média ponderada pelo comprimento x média simples x gpd.overlay
+#
+# Uso: python benchmarks/bench_comprimento.py [--roads Risco3.geojson] [--segmentos 20000]
+import argparse
+import os
+import sys
+import time
+
+import geopandas as gpd
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agregacao_risco import calcular_risco_hexagonos, calcular_risco_hexagonos_comprimento  # noqa: E402
+from malha_sintetica import carregar_malha  # noqa: E402
+
+
+def calcular_risco_overlay(hexagonos_h3, malha_viaria, crs_metrico):
+    # Referência: overlay do geopandas + groupby, uma coluna de cada vez
+    hexagonos = hexagonos_h3[["geometry"]].reset_index(names="posicao").to_crs(crs_metrico)
+    recortes = gpd.overlay(malha_viaria[["KmP", "KmP_dark", "geometry"]].to_crs(crs_metrico), hexagonos,
+                           how="intersection", keep_geom_type=True)
+    recortes["comprimento"] = recortes.length
+    recortes = recortes[recortes["comprimento"] > 0]
+    resultado = hexagonos_h3.copy()
+    for coluna in ["KmP", "KmP_dark"]:
+        ponderado = (recortes[coluna] * recortes["comprimento"]).groupby(recortes["posicao"]).sum()
+        media = ponderado / recortes["comprimento"].groupby(recortes["posicao"]).sum()
+        resultado[f"risk_mean_{coluna}"] = media.reindex(range(len(hexagonos_h3))).fillna(0).to_numpy()
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--roads", default="Risco3.geojson")
+    parser.add_argument("--hex", default="H3.geojson")
+    parser.add_argument("--segmentos", type=int, default=20000)
+    args = parser.parse_args()
+
+    hexagonos_h3 = gpd.read_file(args.hex)
+    malha_viaria = carregar_malha(args.roads, hexagonos_h3, args.segmentos)
+    crs_metrico = hexagonos_h3.estimate_utm_crs()
+    print(f"{len(hexagonos_h3)} hexágonos, {len(malha_viaria)} segmentos, CRS métrico {crs_metrico.to_string()}")
+
+    inicio = time.perf_counter()
+    simples = calcular_risco_hexagonos(hexagonos_h3, malha_viaria)
+    tempo_simples = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    ponderado = calcular_risco_hexagonos_comprimento(hexagonos_h3, malha_viaria, crs_metrico=crs_metrico)
+    tempo_ponderado = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    referencia = calcular_risco_overlay(hexagonos_h3, malha_viaria, crs_metrico)
+    tempo_overlay = time.perf_counter() - inicio
+
+    for coluna in ["risk_mean_KmP", "risk_mean_KmP_dark"]:
+        np.testing.assert_allclose(ponderado[coluna], referencia[coluna], rtol=1e-9, atol=1e-9)
+    mudou = (ponderado["risk_mean_rounded_KmP"] != simples["risk_mean_rounded_KmP"]).mean()
+
+    print(f"média simples (sindex+groupby):  {tempo_simples:8.3f} s")
+    print(f"ponderada (recorte vetorizado):  {tempo_ponderado:8.3f} s")
+    print(f"ponderada (gpd.overlay):         {tempo_overlay:8.3f} s  ({tempo_overlay / tempo_ponderado:.1f}x)")
+    print(f"{mudou:.1%} dos hexágonos mudam de classe diurna com a ponderação")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+# Benchmark: filtro por coordenadas com varredura linear (intersects) x sindex.query
+#
+# Hexágonos sintéticos (células H3) em resoluções crescentes sobre a área do H3.geojson.
+import os
+import sys
+import time
+
+import geopandas as gpd
+import h3
+import shapely
+from shapely.geometry import Point, box
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from filtros import filtrar_por_geometria  # noqa: E402
+
+CONSULTAS = {
+    "retângulo": (box(-43.372672, -22.817762, -43.222538, -22.664081), None),
+    "ponto": (Point(-43.20, -22.90), 0.01),
+}
+
+
+def celulas(limites, resolucao):
+    minx, miny, maxx, maxy = limites
+    poligono = h3.LatLngPoly([(miny, minx), (miny, maxx), (maxy, maxx), (maxy, minx)])
+    indices = list(h3.polygon_to_cells(poligono, resolucao))
+    geometrias = [shapely.Polygon([(lng, lat) for lat, lng in h3.cell_to_boundary(i)]) for i in indices]
+    return gpd.GeoDataFrame({"index": indices}, geometry=geometrias, crs="EPSG:4326")
+
+
+def cronometrar(funcao, repeticoes=20):
+    melhor = float("inf")
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor * 1000
+
+
+def main():
+    limites = gpd.read_file("H3.geojson").total_bounds
+    for resolucao in (6, 7, 8, 9):
+        hexagonos = celulas(limites, resolucao)
+        hexagonos.sindex  # árvore construída uma vez, como na camada base em cache
+        for nome, (geometria, distancia) in CONSULTAS.items():
+            area = geometria if distancia is None else geometria.buffer(distancia)
+            t_linear = cronometrar(lambda: hexagonos[hexagonos.intersects(area)])
+            t_indice = cronometrar(lambda: filtrar_por_geometria(hexagonos, geometria, distancia))
+            print(
+                f"{len(hexagonos):7d} hexágonos, {nome:9s}: intersects {t_linear:8.2f} ms"
+                f" | sindex {t_indice:6.2f} ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
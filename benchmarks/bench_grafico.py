@@ -0,0 +1,55 @@
+# Benchmark: gráfico de riscos com 7 traces go.Bar (antigo) x trace único a partir do modelo
+import os
+import sys
+import time
+
+import plotly.graph_objects as go
+import plotly.io as pio
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from grafico import CORES_RISCO, grafico_riscos  # noqa: E402
+
+PERCENTUAL = [45.2, 12.1, 9.8, 11.0, 8.4, 7.5, 6.0]
+
+
+def grafico_antigo(percentual, tipo_risco):
+    # Como test_rj19.py montava o gráfico antes
+    fig = go.Figure()
+    for i, cor in enumerate(CORES_RISCO):
+        fig.add_trace(go.Bar(x=[i], y=[percentual[i]], name=f"Risco {i}", marker_color=cor))
+    fig.update_layout(
+        title=dict(text=f"Distribuição de Risco ({tipo_risco})", font=dict(color="#0F2355")),
+        xaxis_title="Categoria de Risco",
+        yaxis_title="% em Hexágonos",
+        xaxis=dict(title=dict(font=dict(color='#0F2355')), tickfont=dict(color='#0F2355')),
+        yaxis=dict(title=dict(font=dict(color='#0F2355')), tickfont=dict(color='#0F2355')),
+        autosize=True,
+        barmode="group",
+        legend=dict(title=dict(font=dict(color='#0F2355')), font=dict(color='#0F2355'))
+    )
+    return fig
+
+
+def medir(construir, repeticoes=200):
+    grafico_riscos(PERCENTUAL, "Diurno")  # aquece o modelo em cache
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        figura = construir(PERCENTUAL, "Diurno")
+    tempo = (time.perf_counter() - inicio) / repeticoes
+    dados = figura.to_plotly_json() if isinstance(figura, go.Figure) else figura
+    # Sem o template padrão do plotly, que é igual nos dois casos
+    dados = {**dados, "layout": {k: v for k, v in dados["layout"].items() if k != "template"}}
+    return len(pio.to_json(dados, validate=False)), tempo
+
+
+def main():
+    bytes_antigo, tempo_antigo = medir(grafico_antigo)
+    bytes_novo, tempo_novo = medir(grafico_riscos)
+    print(f"7 traces:     {bytes_antigo:6d} bytes de JSON, {tempo_antigo * 1000:6.2f} ms por figura")
+    print(f"trace único:  {bytes_novo:6d} bytes de JSON, {tempo_novo * 1000:6.2f} ms por figura")
+    assert bytes_novo < bytes_antigo
+
+
+if __name__ == "__main__":
+    main()
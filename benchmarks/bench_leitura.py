@@ -0,0 +1,52 @@
+# Benchmark: leitura das camadas em GeoJSON x GeoParquet (com projeção de colunas)
+#
+# Uso: python benchmarks/bench_leitura.py   (gera as cópias .parquet se faltarem)
+import os
+import sys
+import time
+
+import geopandas as gpd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from camadas_parquet import CAMADAS, caminho_parquet, converter_para_parquet, ler_parquet  # noqa: E402
+
+# Colunas que o dashboard realmente usa de cada camada
+PROJECOES = {
+    "Risco3.geojson": ["empresa"],
+    "H3.geojson": ["index"],
+    "AU.geojson": [],
+    "hexagonos_h3_com_risco.geojson": ["index", "risk_mean_rounded_KmP"],
+}
+
+
+def cronometrar(funcao, repeticoes=5):
+    melhor = float("inf")
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor
+
+
+def main():
+    for caminho in CAMADAS:
+        if not os.path.exists(caminho):
+            print(f"{caminho}: não encontrado, ignorado")
+            continue
+        destino = caminho_parquet(caminho)
+        if not os.path.exists(destino):
+            converter_para_parquet(caminho)
+        colunas = PROJECOES[caminho]
+
+        t_geojson = cronometrar(lambda: gpd.read_file(caminho))
+        t_parquet = cronometrar(lambda: gpd.read_parquet(destino))
+        t_projecao = cronometrar(lambda: ler_parquet(destino, colunas))
+        print(
+            f"{caminho:32s} geojson {t_geojson * 1000:7.1f} ms | gpd.read_parquet {t_parquet * 1000:7.1f} ms"
+            f" | ler_parquet {colunas} {t_projecao * 1000:7.1f} ms ({t_geojson / t_projecao:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
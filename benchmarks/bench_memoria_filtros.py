@@ -0,0 +1,65 @@
+# Benchmark: pico de RSS ao filtrar com cópia da camada (antigo) x máscaras/posições
+#
+# Cada modo roda em um subprocesso; N "sessões" mantêm o resultado do filtro vivo,
+# como acontece enquanto o script de cada sessão desenha o mapa.
+import os
+import resource
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+COLUNA = "risk_mean_rounded_KmP"
+
+
+def camada_grande(repeticoes):
+    import pandas as pd
+    import geopandas as gpd
+    from camadas_parquet import ler_camada
+
+    base = ler_camada("hexagonos_h3_com_risco.geojson", ["index", COLUNA])
+    return gpd.GeoDataFrame(pd.concat([base] * repeticoes, ignore_index=True), crs=base.crs)
+
+
+def sessao_antiga(base):
+    # Como test_rj19.py fazia antes: cópia completa e filtros encadeados
+    filtrados = base.copy()
+    filtrados = filtrados[filtrados[COLUNA].isin([1, 2, 3, 4, 5, 6])]
+    return filtrados, filtrados[COLUNA].value_counts()
+
+
+def sessao_nova(base):
+    from filtros import aplicar_filtros
+
+    posicoes = aplicar_filtros(base, {}, COLUNA, riscos=[1, 2, 3, 4, 5, 6])
+    return posicoes, base[COLUNA].iloc[posicoes].value_counts()
+
+
+def medir(modo, sessoes, repeticoes):
+    base = camada_grande(repeticoes)
+    base.sindex
+    antes = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    funcao = sessao_antiga if modo == "copia" else sessao_nova
+    resultados = [funcao(base) for _ in range(sessoes)]
+    depois = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"{(depois - antes) / 1024 / sessoes:.2f}")
+    return resultados
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "--modo":
+        medir(sys.argv[2], int(sys.argv[3]), int(sys.argv[4]))
+        return
+
+    sessoes, repeticoes = 20, 50
+    print(f"{sessoes} sessões sobre {1348 * repeticoes} hexágonos")
+    for modo, descricao in (("copia", "hexagonos_h3.copy() + filtros"), ("mascara", "máscaras/posições")):
+        saida = subprocess.run(
+            [sys.executable, __file__, "--modo", modo, str(sessoes), str(repeticoes)],
+            capture_output=True, text=True, check=True,
+        )
+        print(f"{descricao:32s} pico de RSS por sessão: {float(saida.stdout.strip()):7.2f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+# Benchmark: escalabilidade da agregação em paralelo (1..N processos)
+#
+# Uso: python benchmarks/bench_paralelo.py [--roads Risco3.geojson] [--segmentos 200000] [--resolucao 8]
+import argparse
+import os
+import sys
+import time
+
+import geopandas as gpd
+import h3
+import numpy as np
+import shapely
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agregacao_risco import calcular_risco_hexagonos, calcular_risco_hexagonos_paralelo  # noqa: E402
+from malha_sintetica import carregar_malha  # noqa: E402
+
+
+def hexagonos_na_area(limites, resolucao):
+    minx, miny, maxx, maxy = limites
+    poligono = h3.LatLngPoly([(miny, minx), (miny, maxx), (maxy, maxx), (maxy, minx)])
+    indices = list(h3.polygon_to_cells(poligono, resolucao))
+    geometrias = [shapely.Polygon([(lng, lat) for lat, lng in h3.cell_to_boundary(i)]) for i in indices]
+    return gpd.GeoDataFrame({"index": indices}, geometry=geometrias, crs="EPSG:4326")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--roads", default="Risco3.geojson")
+    parser.add_argument("--segmentos", type=int, default=200000)
+    parser.add_argument("--resolucao", type=int, default=8)
+    parser.add_argument("--max-processos", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    hexagonos = hexagonos_na_area(gpd.read_file("H3.geojson").total_bounds, args.resolucao)
+    malha_viaria = carregar_malha(args.roads, hexagonos, args.segmentos)
+    print(f"{len(hexagonos)} hexágonos (resolução {args.resolucao}), {len(malha_viaria)} segmentos, "
+          f"{os.cpu_count()} CPUs")
+
+    inicio = time.perf_counter()
+    referencia = calcular_risco_hexagonos(hexagonos, malha_viaria)
+    tempo_sequencial = time.perf_counter() - inicio
+    print(f"sequencial:    {tempo_sequencial:7.2f} s")
+
+    for processos in sorted({1, 2, 4, 8, args.max_processos} & set(range(1, args.max_processos + 1))):
+        inicio = time.perf_counter()
+        resultado = calcular_risco_hexagonos_paralelo(hexagonos, malha_viaria, processos=processos)
+        tempo = time.perf_counter() - inicio
+        np.testing.assert_allclose(resultado["risk_mean_KmP"], referencia["risk_mean_KmP"])
+        print(f"{processos:2d} processo(s): {tempo:7.2f} s  ({tempo_sequencial / tempo:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+# Benchmark: tamanho do HTML e tempo de serialização do mapa
+# Choropleth + GeoJson de tooltip (antigo) x camada única (mapa.camada_hexagonos)
+import os
+import sys
+import time
+
+import folium
+from folium import Choropleth, GeoJsonTooltip
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from camadas_parquet import ler_camada  # noqa: E402
+from mapa import camada_hexagonos, legenda_risco  # noqa: E402
+
+COLUNA = "risk_mean_rounded_KmP"
+
+
+def mapa_antigo(hexagonos):
+    m = folium.Map(location=[-22.90, -43.20], zoom_start=8)
+    Choropleth(
+        geo_data=hexagonos,
+        data=hexagonos,
+        columns=["index", COLUNA],
+        key_on="feature.properties.index",
+        fill_color="RdYlGn_r",
+        fill_opacity=0.6,
+        line_opacity=0.2,
+        legend_name="Risco Médio (Diurno)",
+        name="Hexágonos Selecionados",
+        highlight=True,
+    ).add_to(m)
+    folium.GeoJson(
+        hexagonos,
+        name="Hexágonos",
+        style_function=lambda x: {'color': 'lightgray', 'weight': 0.3, 'fillOpacity': 0},
+        tooltip=GeoJsonTooltip(fields=[COLUNA], aliases=['Risco:'], localize=True),
+    ).add_to(m)
+    return m
+
+
+def mapa_novo(hexagonos):
+    m = folium.Map(location=[-22.90, -43.20], zoom_start=8)
+    camada_hexagonos(hexagonos, COLUNA).add_to(m)
+    legenda_risco("Diurno").add_to(m)
+    return m
+
+
+def mapa_novo_zoom8(hexagonos):
+    m = folium.Map(location=[-22.90, -43.20], zoom_start=8)
+    camada_hexagonos(hexagonos, COLUNA, zoom=8).add_to(m)
+    legenda_risco("Diurno").add_to(m)
+    return m
+
+
+def medir(construir, hexagonos):
+    inicio = time.perf_counter()
+    html = construir(hexagonos).get_root().render()
+    return len(html.encode("utf-8")), time.perf_counter() - inicio
+
+
+def main():
+    hexagonos = ler_camada("hexagonos_h3_com_risco.geojson", ["index", COLUNA])
+    bytes_antigo, tempo_antigo = medir(mapa_antigo, hexagonos)
+    bytes_novo, tempo_novo = medir(mapa_novo, hexagonos)
+    bytes_zoom, tempo_zoom = medir(mapa_novo_zoom8, hexagonos)
+    print(f"Choropleth + GeoJson: {bytes_antigo / 1e6:6.2f} MB  {tempo_antigo * 1000:7.1f} ms")
+    print(f"camada única:         {bytes_novo / 1e6:6.2f} MB  {tempo_novo * 1000:7.1f} ms")
+    print(f"camada única, zoom 8: {bytes_zoom / 1e6:6.2f} MB  {tempo_zoom * 1000:7.1f} ms")
+    print(f"redução:              {1 - bytes_novo / bytes_antigo:6.1%} bytes, {1 - tempo_novo / tempo_antigo:6.1%} tempo")
+    assert bytes_novo < 0.6 * bytes_antigo
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+# Benchmark: execuções do dashboard durante um minuto típico de exploração do mapa
+#
+# O test_rj19.py roda no AppTest do Streamlit com o st_folium substituído por um
+# dublê que registra os argumentos passados pelo app (chave e returned_objects)
+# e conta cada execução do mapa. Para cada evento do roteiro (pan, zoom, clique,
+# desenho) o dublê faz o papel do componente no navegador: muda o estado do mapa,
+# filtra pelas chaves em returned_objects e só dispara uma nova execução se o
+# valor filtrado mudou, como faz o st_folium.
+#
+# Uso: python benchmarks/bench_reruns.py   (na pasta com os dados)
+import os
+import time
+
+import streamlit_folium
+from streamlit.testing.v1 import AppTest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Um minuto típico: navegar, aproximar, clicar em hexágonos e desenhar uma área
+ROTEIRO_MINUTO = ["pan", "pan", "zoom", "pan", "clique", "pan", "zoom", "pan", "pan", "clique", "zoom", "pan",
+                  "desenho", "pan", "zoom", "clique", "pan", "pan", "zoom", "pan", "clique", "zoom", "pan"]
+
+# (nome, ignorar returned_objects como o app antigo, marcar "Acompanhar a vista do mapa")
+CONFIGURACOES = [
+    ("antes (todos os objetos)", True, False),
+    ("depois (padrão)", False, False),
+    ("depois, acompanhar a vista", False, True),
+]
+
+
+class DubleStFolium:
+    """Substitui st_folium: registra os argumentos e conta as execuções do mapa."""
+
+    def __init__(self):
+        self.execucoes = 0
+        self.chave = None
+        self.returned_objects = None
+
+    def __call__(self, mapa, key=None, returned_objects=None, **kwargs):
+        self.execucoes += 1
+        self.chave = key
+        self.returned_objects = returned_objects
+        return None
+
+
+def aplicar_evento(estado, evento, passo):
+    # Estado completo do mapa no navegador depois do evento
+    lat, lng = estado["center"]["lat"], estado["center"]["lng"]
+    if evento in ("pan", "zoom"):
+        lat, lng = lat + 0.01 * passo, lng - 0.01 * passo
+        if evento == "zoom":
+            estado["zoom"] = min(estado["zoom"] + 1, 14)
+        meia = 2.0 ** (8 - estado["zoom"])
+        estado["center"] = {"lat": lat, "lng": lng}
+        estado["bounds"] = {"_southWest": {"lat": lat - meia / 2, "lng": lng - meia},
+                            "_northEast": {"lat": lat + meia / 2, "lng": lng + meia}}
+    elif evento == "clique":
+        estado["last_clicked"] = {"lat": lat, "lng": lng + passo * 1e-3}
+    elif evento == "desenho":
+        desenho = {"type": "Feature", "properties": {"radius": 5000},
+                   "geometry": {"type": "Point", "coordinates": [lng, lat]}}
+        estado["all_drawings"] = [desenho]
+        estado["last_active_drawing"] = desenho
+
+
+def medir(ignorar_returned_objects, acompanhar_vista):
+    duble = DubleStFolium()
+    original = streamlit_folium.st_folium
+    streamlit_folium.st_folium = duble
+    try:
+        app = AppTest.from_file(os.path.join(RAIZ, "test_rj19.py"), default_timeout=300)
+        app.run()
+        if acompanhar_vista:
+            app.sidebar.checkbox[0].check().run()
+        erros = [e.value for e in app.exception] + [e.value for e in app.error]
+        execucoes_iniciais = duble.execucoes
+
+        estado = {"center": {"lat": -22.90, "lng": -43.20}, "zoom": 8, "bounds": None, "last_clicked": None,
+                  "all_drawings": None, "last_active_drawing": None}
+        retornados = None if ignorar_returned_objects else duble.returned_objects
+        enviado = {k: v for k, v in estado.items() if retornados is None or k in retornados}
+        tempo = 0.0
+        for passo, evento in enumerate(ROTEIRO_MINUTO):
+            aplicar_evento(estado, evento, passo)
+            retornados = None if ignorar_returned_objects else duble.returned_objects
+            valor = {k: v for k, v in estado.items() if retornados is None or k in retornados}
+            if valor != enviado:
+                enviado = valor
+                app.session_state[duble.chave] = dict(valor)
+                inicio = time.perf_counter()
+                app.run()
+                tempo += time.perf_counter() - inicio
+                erros += [e.value for e in app.exception]
+        return duble.execucoes - execucoes_iniciais, tempo, erros
+    finally:
+        streamlit_folium.st_folium = original
+
+
+def main():
+    print(f"roteiro: {len(ROTEIRO_MINUTO)} eventos por minuto")
+    for nome, ignorar, acompanhar in CONFIGURACOES:
+        execucoes, tempo, erros = medir(ignorar, acompanhar)
+        aviso = f"  (erro no app: {erros[0][:60]}...)" if erros else ""
+        print(f"{nome:28s} {execucoes:3d} execuções/min  {tempo:5.1f} s de servidor/min{aviso}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+# Benchmark: hexágonos e bytes enviados ao mapa com e sem recorte pela área visível
+#
+# Para algumas vistas típicas (bounds do Leaflet + zoom), compara a camada inteira
+# no nível escolhido só pelo zoom com o recorte pela vista (mapa.limites_vista) e
+# o orçamento de hexágonos visíveis (mapa.resolucao_para_vista).
+#
+# Uso: python benchmarks/bench_vista.py   (na pasta com hexagonos_h3_com_risco.geojson e a pirâmide)
+import os
+import sys
+import time
+
+import folium
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from camadas_parquet import ler_camada  # noqa: E402
+from filtros import posicoes_na_geometria  # noqa: E402
+from mapa import (  # noqa: E402
+    RESOLUCAO_BASE,
+    camada_hexagonos,
+    limites_vista,
+    resolucao_para_vista,
+    resolucao_para_zoom,
+)
+
+COLUNA = "risk_mean_rounded_KmP"
+
+# (nome, zoom, (sul, oeste, norte, leste))
+VISTAS = [
+    ("bairro", 14, (-22.93, -43.21, -22.89, -43.15)),
+    ("município", 11, (-23.05, -43.55, -22.75, -43.10)),
+    ("região metropolitana", 9, (-23.20, -43.90, -22.40, -42.60)),
+    ("estado", 7, (-23.40, -45.00, -20.70, -40.90)),
+]
+
+
+def bytes_camada(hexagonos, zoom):
+    m = folium.Map()
+    camada_hexagonos(hexagonos, COLUNA, zoom=zoom).add_to(m)
+    return len(m.get_root().render().encode("utf-8"))
+
+
+def main():
+    camadas = {RESOLUCAO_BASE: ler_camada("hexagonos_h3_com_risco.geojson", ["index", COLUNA])}
+    if os.path.exists("piramide_h3_risco.geojson"):
+        piramide = ler_camada("piramide_h3_risco.geojson", ["index", "resolucao", COLUNA])
+        for resolucao, nivel in piramide.groupby("resolucao"):
+            if resolucao != RESOLUCAO_BASE:
+                camadas[resolucao] = nivel.reset_index(drop=True)
+    contagens = {resolucao: len(camada) for resolucao, camada in camadas.items()}
+
+    for nome, zoom, (sul, oeste, norte, leste) in VISTAS:
+        bounds = {"_southWest": {"lat": sul, "lng": oeste}, "_northEast": {"lat": norte, "lng": leste}}
+        vista = limites_vista(bounds)
+
+        resolucao_zoom = resolucao_para_zoom(zoom, contagens)
+        inteira = camadas[resolucao_zoom]
+
+        inicio = time.perf_counter()
+        resolucao = resolucao_para_vista(zoom, contagens, lambda r: len(posicoes_na_geometria(camadas[r], vista)))
+        recorte = camadas[resolucao].iloc[posicoes_na_geometria(camadas[resolucao], vista)]
+        tempo = time.perf_counter() - inicio
+
+        print(
+            f"{nome:22s} zoom {zoom:2d}: inteira res {resolucao_zoom} {len(inteira):6d} hex "
+            f"{bytes_camada(inteira, zoom) / 1e3:8.1f} kB | vista res {resolucao} {len(recorte):6d} hex "
+            f"{bytes_camada(recorte, zoom) / 1e3:8.1f} kB  (seleção {tempo * 1000:.1f} ms)"
+        )
+
+
+if __name__ == "__main__":
+    main()
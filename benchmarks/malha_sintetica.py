@@ -0,0 +1,37 @@
+# Malha viária sintética para os benchmarks quando Risco3.geojson não está disponível
+import os
+
+import geopandas as gpd
+import numpy as np
+from shapely.geometry import LineString
+
+EMPRESAS = ["Concessionária A", "Concessionária B", "Concessionária C", "Concessionária D"]
+
+
+def gerar_malha(n_segmentos, limites, semente=0):
+    """Gera `n_segmentos` linhas curtas aleatórias dentro de `limites` (minx, miny, maxx, maxy)."""
+    rng = np.random.default_rng(semente)
+    minx, miny, maxx, maxy = limites
+    x0 = rng.uniform(minx, maxx, n_segmentos)
+    y0 = rng.uniform(miny, maxy, n_segmentos)
+    dx = rng.normal(0, 0.02, n_segmentos)
+    dy = rng.normal(0, 0.02, n_segmentos)
+    geometrias = [LineString([(x, y), (x + a, y + b)]) for x, y, a, b in zip(x0, y0, dx, dy)]
+    return gpd.GeoDataFrame(
+        {
+            "id": np.arange(n_segmentos),
+            "empresa": rng.choice(EMPRESAS, n_segmentos),
+            "KmP": rng.integers(0, 7, n_segmentos).astype(float),
+            "KmP_dark": rng.integers(0, 7, n_segmentos).astype(float),
+        },
+        geometry=geometrias,
+        crs="EPSG:4326",
+    )
+
+
+def carregar_malha(caminho, hexagonos, n_segmentos):
+    """Lê a malha real se existir; caso contrário gera uma sintética sobre os hexágonos."""
+    if os.path.exists(caminho):
+        return gpd.read_file(caminho)
+    print(f"{caminho} não encontrado, usando malha sintética com {n_segmentos} segmentos")
+    return gerar_malha(n_segmentos, hexagonos.total_bounds)
@@ -0,0 +1,258 @@
+# Cache do layer de hexágonos com risco, endereçado pelo conteúdo das entradas
+import hashlib
+import json
+import os
+
+import geopandas as gpd
+import shapely
+from scipy import sparse
+
+from agregacao_risco import (
+    COLUNAS_RISCO,
+    METODOS,
+    RESOLUCOES_PIRAMIDE,
+    calcular_piramide_h3,
+    calcular_risco_hexagonos_comprimento,
+    hexagonos_afetados,
+    matriz_pertinencia,
+    recalcular_hexagonos,
+)
+from camadas_parquet import converter_para_parquet, digest_arquivos, ler_camada, ler_parquet
+
+# Incrementar quando o método de agregação mudar, para invalidar caches antigos
+VERSAO_AGREGACAO = 1
+
+
+def chave_cache(digest, parametros):
+    return hashlib.sha256((digest + json.dumps(parametros, sort_keys=True)).encode("utf-8")).hexdigest()
+
+
+def hash_entradas(caminhos, parametros):
+    """SHA-256 do conteúdo de `caminhos` e dos `parametros` (dicionário serializável em JSON)."""
+    return chave_cache(digest_arquivos(caminhos), parametros)
+
+
+def parametros_hexagonos(colunas=COLUNAS_RISCO, metodo="intersecao"):
+    return {"colunas": list(colunas), "metodo": metodo, "versao": VERSAO_AGREGACAO}
+
+
+def parametros_piramide(colunas=COLUNAS_RISCO, resolucoes=RESOLUCOES_PIRAMIDE, metodo="intersecao"):
+    return {
+        "colunas": list(colunas),
+        "resolucoes": list(resolucoes),
+        "metodo": metodo,
+        "piramide": True,
+        "versao": VERSAO_AGREGACAO,
+    }
+
+
+def caminho_chave(caminho_saida):
+    # A chave fica ao lado do artefato: hexagonos_h3_com_risco.geojson.sha256
+    return f"{caminho_saida}.sha256"
+
+
+def cache_valido(caminho_saida, chave):
+    if not os.path.exists(caminho_saida) or not os.path.exists(caminho_chave(caminho_saida)):
+        return False
+    with open(caminho_chave(caminho_saida)) as arquivo:
+        return arquivo.read().strip() == chave
+
+
+def _remover_chave(caminho_saida):
+    # Antes de trocar o artefato: uma interrupção no meio nunca deixa uma chave antiga valendo para ele
+    if os.path.exists(caminho_chave(caminho_saida)):
+        os.remove(caminho_chave(caminho_saida))
+
+
+def gravar_artefato(gdf, caminho_saida, chave):
+    # Chave antiga removida, artefato (e sua cópia parquet) gravado, chave nova por último
+    temporario = f"{caminho_saida}.tmp"
+    gdf.to_file(temporario, driver="GeoJSON")
+    _remover_chave(caminho_saida)
+    os.replace(temporario, caminho_saida)
+    converter_para_parquet(caminho_saida, gdf)
+    with open(caminho_chave(caminho_saida), "w") as arquivo:
+        arquivo.write(chave)
+
+
+def caminho_estado_incremental(caminho_saida):
+    # Malha usada no último cálculo e metadados para a atualização incremental
+    return f"{caminho_saida}.malha.parquet", f"{caminho_saida}.incremental.json"
+
+
+def _ler_estado_incremental(caminho_saida, chave_base, coluna_id):
+    caminho_malha_anterior, caminho_metadados = caminho_estado_incremental(caminho_saida)
+    if not all(os.path.exists(c) for c in (caminho_saida, caminho_malha_anterior, caminho_metadados)):
+        return None
+    with open(caminho_metadados) as arquivo:
+        metadados = json.load(arquivo)
+    if metadados.get("chave_base") != chave_base or metadados.get("coluna_id") != coluna_id:
+        return None
+    return ler_camada(caminho_saida), ler_parquet(caminho_malha_anterior)
+
+
+def caminho_matriz(caminho_saida):
+    return f"{caminho_saida}.pertinencia.npz"
+
+
+def digest_geometrias(*camadas):
+    """SHA-256 (hex) das geometrias e CRS das camadas, ignorando os atributos."""
+    h = hashlib.sha256()
+    for camada in camadas:
+        h.update(str(camada.crs).encode("utf-8"))
+        for wkb in shapely.to_wkb(camada.geometry.values):
+            h.update(wkb)
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def obter_matriz_pertinencia(hexagonos, malha_viaria, caminho):
+    """`matriz_pertinencia` persistida em `caminho` (.npz), refeita só se alguma geometria mudou.
+
+    Como a chave não depende dos atributos, mudar valores ou acrescentar uma
+    coluna na malha reaproveita a matriz: a agregação vira um produto esparso.
+    """
+    chave = chave_cache(digest_geometrias(hexagonos, malha_viaria), {"pertinencia": True, "versao": VERSAO_AGREGACAO})
+    if cache_valido(caminho, chave):
+        return sparse.load_npz(caminho)
+
+    matriz = matriz_pertinencia(hexagonos, malha_viaria)
+    temporario = f"{caminho}.tmp"
+    with open(temporario, "wb") as arquivo:
+        sparse.save_npz(arquivo, matriz, compressed=False)
+    _remover_chave(caminho)
+    os.replace(temporario, caminho)
+    with open(caminho_chave(caminho), "w") as arquivo:
+        arquivo.write(chave)
+    return matriz
+
+
+def atualizar_hexagonos_com_risco(
+    caminho_malha="Risco3.geojson",
+    caminho_hexagonos="H3.geojson",
+    caminho_saida="hexagonos_h3_com_risco.geojson",
+    colunas=COLUNAS_RISCO,
+    metodo="intersecao",
+    coluna_id=None,
+):
+    """Garante que `caminho_saida` corresponde às entradas atuais.
+
+    Retorna o GeoDataFrame recalculado, ou None se o cache já era válido.
+    O artefato é escrito antes da chave e via arquivo temporário, então uma
+    interrupção no meio do cálculo nunca deixa uma chave válida apontando para
+    um artefato antigo.
+
+    Com `coluna_id` (id único dos segmentos em Risco3), se apenas a malha mudou
+    desde o último cálculo, só os hexágonos tocados pelos segmentos alterados
+    são recalculados. No método "comprimento", o cálculo completo reaproveita a
+    matriz de pertinência persistida ao lado do artefato.
+    """
+    parametros = parametros_hexagonos(colunas, metodo)
+    chave = hash_entradas([caminho_malha, caminho_hexagonos], parametros)
+
+    if cache_valido(caminho_saida, chave):
+        return None
+
+    malha_viaria = gpd.read_file(caminho_malha)
+    chave_base = hash_entradas([caminho_hexagonos], parametros)
+    estado = None
+    if coluna_id is not None and coluna_id in malha_viaria.columns:
+        estado = _ler_estado_incremental(caminho_saida, chave_base, coluna_id)
+
+    hexagonos_h3 = None
+    if estado is not None:
+        hexagonos_anteriores, malha_anterior = estado
+        try:
+            posicoes = hexagonos_afetados(hexagonos_anteriores, malha_anterior, malha_viaria, coluna_id, colunas)
+        except ValueError:
+            posicoes = None
+        if posicoes is not None:
+            hexagonos_h3 = recalcular_hexagonos(
+                hexagonos_anteriores, posicoes, malha_viaria, colunas, METODOS[metodo]
+            )
+    if hexagonos_h3 is None:
+        hexagonos_h3 = gpd.read_file(caminho_hexagonos)
+        if metodo == "comprimento":
+            matriz = obter_matriz_pertinencia(hexagonos_h3, malha_viaria, caminho_matriz(caminho_saida))
+            hexagonos_h3 = calcular_risco_hexagonos_comprimento(hexagonos_h3, malha_viaria, colunas, matriz=matriz)
+        else:
+            hexagonos_h3 = METODOS[metodo](hexagonos_h3, malha_viaria, colunas)
+
+    # Sem metadados durante a escrita: uma interrupção força o cálculo completo na próxima vez
+    caminho_malha_anterior, caminho_metadados = caminho_estado_incremental(caminho_saida)
+    if os.path.exists(caminho_metadados):
+        os.remove(caminho_metadados)
+    gravar_artefato(hexagonos_h3, caminho_saida, chave)
+    if coluna_id is not None and coluna_id in malha_viaria.columns:
+        malha_viaria[[coluna_id] + list(colunas) + ["geometry"]].to_parquet(caminho_malha_anterior, index=False)
+        with open(caminho_metadados, "w") as arquivo:
+            json.dump({"chave_base": chave_base, "coluna_id": coluna_id}, arquivo)
+    return hexagonos_h3
+
+
+def atualizar_piramide_risco(
+    caminho_malha="Risco3.geojson",
+    caminho_hexagonos="H3.geojson",
+    caminho_saida="piramide_h3_risco.geojson",
+    resolucoes=RESOLUCOES_PIRAMIDE,
+    colunas=COLUNAS_RISCO,
+    metodo="intersecao",
+):
+    """Mesma lógica de cache de `atualizar_hexagonos_com_risco`, para a pirâmide H3.
+
+    Use o mesmo `metodo` da camada base, para que as cores não mudem ao trocar de nível.
+    """
+    chave = hash_entradas([caminho_malha, caminho_hexagonos], parametros_piramide(colunas, resolucoes, metodo))
+
+    if cache_valido(caminho_saida, chave):
+        return None
+
+    malha_viaria = gpd.read_file(caminho_malha)
+    hexagonos_h3 = gpd.read_file(caminho_hexagonos)
+    piramide = calcular_piramide_h3(hexagonos_h3, malha_viaria, resolucoes, colunas, METODOS[metodo])
+    gravar_artefato(piramide, caminho_saida, chave)
+    return piramide
+
+
+def metodo_hexagonos_com_risco(
+    caminho_malha="Risco3.geojson",
+    caminho_hexagonos="H3.geojson",
+    caminho_saida="hexagonos_h3_com_risco.geojson",
+    colunas=COLUNAS_RISCO,
+):
+    """Método com que o artefato foi gerado a partir das entradas atuais, ou None se ausente/desatualizado."""
+    if not all(os.path.exists(c) for c in (caminho_malha, caminho_hexagonos)):
+        return None
+    digest = digest_arquivos([caminho_malha, caminho_hexagonos])
+    for metodo in METODOS:
+        if cache_valido(caminho_saida, chave_cache(digest, parametros_hexagonos(colunas, metodo))):
+            return metodo
+    return None
+
+
+def hexagonos_com_risco_atualizados(
+    caminho_malha="Risco3.geojson",
+    caminho_hexagonos="H3.geojson",
+    caminho_saida="hexagonos_h3_com_risco.geojson",
+    colunas=COLUNAS_RISCO,
+):
+    """True se o artefato foi gerado (por qualquer método) a partir das entradas atuais."""
+    return metodo_hexagonos_com_risco(caminho_malha, caminho_hexagonos, caminho_saida, colunas) is not None
+
+
+def piramide_atualizada(
+    caminho_malha="Risco3.geojson",
+    caminho_hexagonos="H3.geojson",
+    caminho_saida="piramide_h3_risco.geojson",
+    resolucoes=RESOLUCOES_PIRAMIDE,
+    colunas=COLUNAS_RISCO,
+    metodo=None,
+):
+    """True se a pirâmide foi gerada a partir das entradas atuais (com `metodo`, se dado)."""
+    if not all(os.path.exists(c) for c in (caminho_malha, caminho_hexagonos)):
+        return False
+    digest = digest_arquivos([caminho_malha, caminho_hexagonos])
+    return any(
+        cache_valido(caminho_saida, chave_cache(digest, parametros_piramide(colunas, resolucoes, m)))
+        for m in (METODOS if metodo is None else [metodo])
+    )
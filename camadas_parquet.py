@@ -0,0 +1,113 @@
+# Cópias GeoParquet das camadas GeoJSON, mais rápidas de ler e com projeção de colunas
+#
+# Uso: python camadas_parquet.py [arquivo.geojson ...]
+import functools
+import hashlib
+import json
+import os
+import sys
+
+import geopandas as gpd
+import pyarrow.parquet as pq
+import pyproj
+import shapely
+
+CAMADAS = ["Risco3.geojson", "H3.geojson", "AU.geojson", "hexagonos_h3_com_risco.geojson"]
+
+# Chave, nos metadados do parquet, com o digest do GeoJSON de origem
+CHAVE_ORIGEM = b"digest_origem"
+
+
+def caminho_parquet(caminho_geojson):
+    return os.path.splitext(caminho_geojson)[0] + ".parquet"
+
+
+def digest_arquivos(caminhos):
+    """SHA-256 (hex) do conteúdo concatenado de `caminhos`."""
+    h = hashlib.sha256()
+    for caminho in caminhos:
+        with open(caminho, "rb") as arquivo:
+            for bloco in iter(lambda: arquivo.read(1 << 20), b""):
+                h.update(bloco)
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+@functools.lru_cache(maxsize=32)
+def _digest_origem(caminho, mtime_ns, tamanho):
+    # mtime e tamanho só decidem quando refazer o hash dentro do processo
+    return digest_arquivos([caminho])
+
+
+def parquet_atualizado(caminho_geojson):
+    """True se a cópia GeoParquet existe e foi gerada a partir do conteúdo atual do GeoJSON de origem."""
+    destino = caminho_parquet(caminho_geojson)
+    if not os.path.exists(destino):
+        return False
+    if not os.path.exists(caminho_geojson):
+        return True
+    metadados = pq.read_schema(destino).metadata or {}
+    estado = os.stat(caminho_geojson)
+    digest = _digest_origem(caminho_geojson, estado.st_mtime_ns, estado.st_size)
+    return metadados.get(CHAVE_ORIGEM) == digest.encode("ascii")
+
+
+def converter_para_parquet(caminho_geojson, gdf=None):
+    """Grava a cópia GeoParquet de `caminho_geojson`, com o digest do GeoJSON nos metadados."""
+    if gdf is None:
+        gdf = gpd.read_file(caminho_geojson)
+    destino = caminho_parquet(caminho_geojson)
+    temporario = f"{destino}.tmp"
+    gdf.to_parquet(temporario, index=False)
+
+    # O geopandas não aceita metadados extras; a tabela é regravada com o digest junto do "geo"
+    tabela = pq.read_table(temporario)
+    metadados = {**tabela.schema.metadata, CHAVE_ORIGEM: digest_arquivos([caminho_geojson]).encode("ascii")}
+    pq.write_table(tabela.replace_schema_metadata(metadados), temporario)
+    os.replace(temporario, destino)
+    return destino
+
+
+@functools.lru_cache(maxsize=None)
+def _crs(projjson):
+    # Interpretar o PROJJSON é a parte mais lenta da leitura; o resultado é reaproveitado
+    return pyproj.CRS.from_json(projjson)
+
+
+def ler_parquet(caminho, colunas=None):
+    """Equivalente a `gpd.read_parquet`, com o CRS interpretado uma única vez por processo."""
+    metadados = json.loads(pq.read_schema(caminho).metadata[b"geo"])
+    coluna_geometria = metadados["primary_column"]
+    colunas_lidas = None if colunas is None else list(colunas) + [coluna_geometria]
+    tabela = pq.read_table(caminho, columns=colunas_lidas)
+
+    # Pela especificação GeoParquet, "crs" ausente significa OGC:CRS84
+    crs = metadados["columns"][coluna_geometria].get("crs", "OGC:CRS84")
+    if isinstance(crs, dict):
+        crs = _crs(json.dumps(crs, sort_keys=True))
+
+    geometrias = shapely.from_wkb(tabela[coluna_geometria].to_numpy(zero_copy_only=False))
+    atributos = tabela.drop_columns([coluna_geometria]).to_pandas()
+    return gpd.GeoDataFrame(atributos, geometry=gpd.GeoSeries(geometrias, crs=crs))
+
+
+def ler_camada(caminho_geojson, colunas=None):
+    """Lê a camada preferindo a cópia GeoParquet, lendo só `colunas` + geometria."""
+    if parquet_atualizado(caminho_geojson):
+        return ler_parquet(caminho_parquet(caminho_geojson), colunas)
+    gdf = gpd.read_file(caminho_geojson)
+    if colunas is not None:
+        gdf = gdf[list(colunas) + ["geometry"]]
+    return gdf
+
+
+def main(caminhos):
+    for caminho in caminhos or CAMADAS:
+        if not os.path.exists(caminho):
+            print(f"{caminho}: não encontrado, ignorado")
+            continue
+        print(f"{caminho} -> {converter_para_parquet(caminho)}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
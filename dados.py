@@ -0,0 +1,199 @@
+# Camada de acesso aos dados do dashboard, compartilhada entre sessões do Streamlit
+#
+# Cada arquivo é lido uma vez por processo (`st.cache_resource`) e relido apenas
+# quando o mtime muda. O GeoDataFrame em cache é compartilhado por todas as
+# sessões e já sai com o índice espacial (`sindex`) construído; quem chama
+# recebe uma cópia rasa (`copy(deep=False)`), que com o Copy-on-Write do pandas
+# reaproveita os dados e esse índice, mas faz qualquer alteração (colunas novas,
+# `.loc[...] =`) valer só para a cópia. Um índice construído na cópia não volta
+# para o cache, por isso ele é montado antes de o frame entrar no cache.
+# Quando existe uma cópia GeoParquet atualizada (camadas_parquet.py), ela é lida
+# no lugar do GeoJSON, apenas com as colunas pedidas.
+#
+# O dashboard não calcula risco: hexagonos_h3_com_risco.geojson e a pirâmide H3
+# são gerados offline por `python -m risk_precompute` e aqui apenas lidos, depois
+# de conferir que a chave gravada corresponde às entradas atuais.
+import hashlib
+import os
+
+import streamlit as st
+
+from cache_risco import caminho_chave, hexagonos_com_risco_atualizados, metodo_hexagonos_com_risco, piramide_atualizada
+from camadas_parquet import caminho_parquet, ler_camada
+from filtros import CacheFiltros, indices_por_concessao
+from grafico import CuboRiscos
+from tiles_vetoriais import FonteTiles, iniciar_servidor
+
+ARQUIVO_MALHA = "Risco3.geojson"
+ARQUIVO_HEXAGONOS = "H3.geojson"
+ARQUIVO_AREAS_URBANAS = "AU.geojson"
+ARQUIVO_HEXAGONOS_RISCO = "hexagonos_h3_com_risco.geojson"
+ARQUIVO_PIRAMIDE = "piramide_h3_risco.geojson"
+
+# Servidor local de tiles vetoriais (modo "Tiles vetoriais" do mapa)
+PORTA_TILES = int(os.environ.get("PORTA_TILES", 8765))
+URL_TILES = os.environ.get("URL_TILES", f"http://localhost:{PORTA_TILES}")
+
+
+def _mtime(caminho):
+    return os.stat(caminho).st_mtime_ns if os.path.exists(caminho) else None
+
+
+def _mtimes(caminho_geojson):
+    return _mtime(caminho_geojson), _mtime(caminho_parquet(caminho_geojson))
+
+
+@st.cache_resource(show_spinner=False, max_entries=16)
+def _ler_arquivo(caminho, colunas, mtimes):
+    # `mtimes` entra apenas na chave do cache
+    gdf = ler_camada(caminho, colunas)
+    gdf.sindex
+    return gdf
+
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def _hexagonos_com_risco_atualizados(mtimes):
+    # `mtimes` (entradas, artefato e chave) entra apenas na chave do cache: o hash só é refeito quando algo muda
+    return hexagonos_com_risco_atualizados(ARQUIVO_MALHA, ARQUIVO_HEXAGONOS, ARQUIVO_HEXAGONOS_RISCO)
+
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def _piramide_atualizada(mtimes):
+    # Só vale a pirâmide calculada com o mesmo método da camada base, para as cores não mudarem entre níveis
+    metodo = metodo_hexagonos_com_risco(ARQUIVO_MALHA, ARQUIVO_HEXAGONOS, ARQUIVO_HEXAGONOS_RISCO)
+    return metodo is not None and piramide_atualizada(ARQUIVO_MALHA, ARQUIVO_HEXAGONOS, ARQUIVO_PIRAMIDE, metodo=metodo)
+
+
+@st.cache_resource(show_spinner=False, max_entries=16)
+def _nivel_piramide(resolucao, colunas, mtimes):
+    piramide = _ler_arquivo(ARQUIVO_PIRAMIDE, colunas, mtimes)
+    nivel = piramide[piramide["resolucao"] == resolucao].reset_index(drop=True)
+    nivel.sindex
+    return nivel
+
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def _contagem_piramide(mtimes):
+    return _ler_arquivo(ARQUIVO_PIRAMIDE, ("resolucao",), mtimes)["resolucao"].value_counts().to_dict()
+
+
+def ler_geojson(caminho, colunas=None):
+    if colunas is not None:
+        colunas = tuple(colunas)
+    return _ler_arquivo(caminho, colunas, _mtimes(caminho)).copy(deep=False)
+
+
+def carregar_malha_viaria(colunas=None):
+    return ler_geojson(ARQUIVO_MALHA, colunas)
+
+
+def carregar_areas_urbanas(colunas=None):
+    return ler_geojson(ARQUIVO_AREAS_URBANAS, colunas)
+
+
+def hexagonos_com_risco_disponiveis():
+    """True se hexagonos_h3_com_risco.geojson existe e foi gerado a partir dos Risco3/H3 atuais."""
+    caminhos = (ARQUIVO_MALHA, ARQUIVO_HEXAGONOS, ARQUIVO_HEXAGONOS_RISCO, caminho_chave(ARQUIVO_HEXAGONOS_RISCO))
+    return _hexagonos_com_risco_atualizados(tuple(_mtime(c) for c in caminhos))
+
+
+def piramide_disponivel():
+    """True se a pirâmide H3 existe e foi gerada a partir dos Risco3/H3 atuais, com o método da camada base."""
+    caminhos = (
+        ARQUIVO_MALHA, ARQUIVO_HEXAGONOS, ARQUIVO_HEXAGONOS_RISCO, caminho_chave(ARQUIVO_HEXAGONOS_RISCO),
+        ARQUIVO_PIRAMIDE, caminho_chave(ARQUIVO_PIRAMIDE),
+    )
+    return _piramide_atualizada(tuple(_mtime(c) for c in caminhos))
+
+
+def carregar_hexagonos_com_risco(colunas=None):
+    return ler_geojson(ARQUIVO_HEXAGONOS_RISCO, colunas)
+
+
+def carregar_nivel_piramide(resolucao, colunas=None):
+    """Células da pirâmide H3 em uma resolução."""
+    if colunas is not None:
+        colunas = tuple(colunas) + ("resolucao",)
+    return _nivel_piramide(resolucao, colunas, _mtimes(ARQUIVO_PIRAMIDE)).copy(deep=False)
+
+
+def contagem_piramide():
+    """Número de células por resolução da pirâmide ({resolucao: n}); vazio se ela não foi gerada."""
+    if not piramide_disponivel():
+        return {}
+    return _contagem_piramide(_mtimes(ARQUIVO_PIRAMIDE))
+
+
+@st.cache_resource(show_spinner=False)
+def _servidor_tiles():
+    return iniciar_servidor(None, porta=PORTA_TILES)
+
+
+@st.cache_resource(show_spinner="Preparando tiles vetoriais...", max_entries=1)
+def _fonte_tiles(mtimes):
+    return FonteTiles({
+        "hexagonos": carregar_hexagonos_com_risco(
+            colunas=["index", "risk_mean_rounded_KmP", "risk_mean_rounded_KmP_dark"]
+        ),
+        "malha": carregar_malha_viaria(colunas=["empresa", "KmP", "KmP_dark"]),
+        "areas_urbanas": carregar_areas_urbanas(colunas=[]),
+    })
+
+
+def iniciar_servidor_tiles():
+    """Garante o servidor de tiles no ar, servindo a versão atual das camadas; retorna a URL base.
+
+    A URL leva uma versão derivada dos mtimes das camadas: depois de um novo
+    `risk_precompute` o navegador pede tiles novos em vez de usar os do cache.
+    """
+    mtimes = tuple(_mtimes(c) for c in (ARQUIVO_HEXAGONOS_RISCO, ARQUIVO_MALHA, ARQUIVO_AREAS_URBANAS))
+    servidor = _servidor_tiles()
+    servidor.RequestHandlerClass.fonte = _fonte_tiles(mtimes)
+    versao = hashlib.sha1(repr(mtimes).encode("utf-8")).hexdigest()[:12]
+    return f"{URL_TILES}/v{versao}"
+
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def _indices_por_concessao(resolucao, versao):
+    malha_viaria = carregar_malha_viaria(colunas=["empresa"])
+    if resolucao is None:
+        hexagonos = carregar_hexagonos_com_risco(colunas=["index"])
+    else:
+        hexagonos = carregar_nivel_piramide(resolucao, colunas=["index"])
+    return indices_por_concessao(hexagonos, malha_viaria)
+
+
+def versao_camada(resolucao=None):
+    """Chave hashable da camada base (resolucao=None) ou de um nível da pirâmide, junto da malha viária.
+
+    Muda sempre que os hexágonos ou a pertinência às concessões mudam; é a chave
+    da camada no `cache_filtros`.
+    """
+    camada = ARQUIVO_HEXAGONOS_RISCO if resolucao is None else ARQUIVO_PIRAMIDE
+    return camada, resolucao, _mtimes(ARQUIVO_MALHA), _mtimes(camada)
+
+
+def carregar_indices_concessoes(resolucao=None):
+    """Pertinência hexágono -> concessão da camada base (resolucao=None) ou de um nível da pirâmide."""
+    return _indices_por_concessao(resolucao, versao_camada(resolucao))
+
+
+@st.cache_resource(show_spinner=False)
+def cache_filtros():
+    """Cache LRU do resultado dos filtros, compartilhado por todas as sessões."""
+    return CacheFiltros(tamanho_maximo=128)
+
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def _cubo_riscos(resolucao, versao):
+    colunas = ["risk_mean_rounded_KmP", "risk_mean_rounded_KmP_dark"]
+    if resolucao is None:
+        hexagonos = carregar_hexagonos_com_risco(colunas=["index"] + colunas)
+    else:
+        hexagonos = carregar_nivel_piramide(resolucao, colunas=["index"] + colunas)
+    return CuboRiscos(hexagonos, carregar_indices_concessoes(resolucao), colunas)
+
+
+def carregar_cubo_riscos(resolucao=None):
+    """Contagens por classe de risco e concessão da camada base ou de um nível da pirâmide."""
+    return _cubo_riscos(resolucao, versao_camada(resolucao))
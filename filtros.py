@@ -0,0 +1,171 @@
+# Filtros do dashboard sobre a camada de hexágonos
+import hashlib
+import json
+import math
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import shapely
+from shapely.affinity import scale
+from shapely.geometry import shape
+
+from agregacao_risco import pares_hexagono_segmento
+
+# Metros por grau de latitude, para converter o raio dos círculos desenhados
+METROS_POR_GRAU = 111320.0
+
+
+def indices_por_concessao(hexagonos, malha_viaria):
+    """{empresa: frozenset de `index` dos hexágonos atravessados por segmentos da empresa}.
+
+    Calculado uma vez por camada; o filtro de concessão vira uma união de
+    conjuntos seguida de `isin`, sem `unary_union` nem interseção a cada rerun.
+    """
+    idx_hex, idx_seg = pares_hexagono_segmento(hexagonos, malha_viaria)
+    # Segmentos sem `empresa` não pertencem a nenhuma concessão
+    com_empresa = malha_viaria["empresa"].notna().to_numpy()[idx_seg]
+    indices = hexagonos["index"].to_numpy()[idx_hex[com_empresa]]
+    empresas = malha_viaria["empresa"].to_numpy()[idx_seg[com_empresa]]
+    resultado = {}
+    for empresa in set(empresas.tolist()):
+        resultado[empresa] = frozenset(indices[empresas == empresa].tolist())
+    return resultado
+
+
+def hexagonos_das_concessoes(indices_concessao, concessoes):
+    return frozenset().union(*(indices_concessao.get(concessao, frozenset()) for concessao in concessoes))
+
+
+def posicoes_na_geometria(hexagonos, geometria, distancia=None):
+    """Posições (ordenadas) dos hexágonos que intersectam `geometria` ou estão a até `distancia`.
+
+    Usa a STRtree de `hexagonos.sindex`, que o GeoDataFrame guarda depois da
+    primeira consulta; passe a camada base compartilhada, não uma cópia, para
+    que a árvore seja construída uma única vez por processo.
+    """
+    if distancia is None:
+        posicoes = hexagonos.sindex.query(geometria, predicate="intersects")
+    else:
+        posicoes = hexagonos.sindex.query(geometria, predicate="dwithin", distance=distancia)
+    return np.sort(posicoes)
+
+
+def filtrar_por_geometria(hexagonos, geometria, distancia=None):
+    return hexagonos.iloc[posicoes_na_geometria(hexagonos, geometria, distancia)]
+
+
+def geometria_desenho(desenho):
+    """Geometria de um desenho do Leaflet.Draw; círculos (ponto + raio em metros) viram polígonos."""
+    geometria = shape(desenho["geometry"])
+    raio = (desenho.get("properties") or {}).get("radius")
+    if raio and geometria.geom_type == "Point":
+        raio_graus = raio / METROS_POR_GRAU
+        geometria = scale(geometria.buffer(raio_graus), xfact=1 / math.cos(math.radians(geometria.y)))
+    return geometria
+
+
+def mascara_desenhos(hexagonos_base, desenhos, todos=True):
+    """Máscara booleana sobre `hexagonos_base` dos hexágonos selecionados pelos desenhos.
+
+    Todos os desenhos são resolvidos em uma única consulta ao índice da camada
+    base. Com `todos=True` o hexágono precisa tocar cada desenho (E); com
+    `todos=False`, basta tocar algum (OU).
+    """
+    geometrias = np.array([geometria_desenho(desenho) for desenho in desenhos], dtype=object)
+    shapely.prepare(geometrias)
+    _, posicoes = hexagonos_base.sindex.query(geometrias, predicate="intersects")
+    contagem = np.bincount(posicoes, minlength=len(hexagonos_base))
+    return contagem == len(geometrias) if todos else contagem > 0
+
+
+def aplicar_filtros(
+    hexagonos_base,
+    indices_concessao,
+    coluna_risco_rounded,
+    riscos=None,
+    concessoes=None,
+    area=None,
+    distancia=None,
+    desenhos=(),
+    todos_desenhos=True,
+):
+    """Cadeia completa de filtros do dashboard, sem efeitos colaterais.
+
+    Retorna as posições (em `hexagonos_base`) dos hexágonos que passam em todos
+    os filtros; nada é copiado, o subconjunto só é materializado por quem for
+    desenhá-lo (`hexagonos_base.iloc[posicoes]`). `riscos`/`concessoes` iguais
+    a None não filtram; `area` (com `distancia` opcional) é o filtro por
+    coordenadas.
+    """
+    mascara = np.ones(len(hexagonos_base), dtype=bool)
+
+    if area is not None:
+        na_area = np.zeros(len(hexagonos_base), dtype=bool)
+        na_area[posicoes_na_geometria(hexagonos_base, area, distancia)] = True
+        mascara &= na_area
+
+    if riscos is not None:
+        mascara &= hexagonos_base[coluna_risco_rounded].isin(list(riscos)).to_numpy()
+
+    if concessoes:
+        mascara &= hexagonos_base["index"].isin(hexagonos_das_concessoes(indices_concessao, concessoes)).to_numpy()
+
+    if desenhos:
+        mascara &= mascara_desenhos(hexagonos_base, desenhos, todos_desenhos)
+    return np.flatnonzero(mascara)
+
+
+def chave_filtros(coluna_risco_rounded, riscos, concessoes, area, distancia, desenhos, todos_desenhos):
+    """Chave hashable do estado dos filtros (desenhos e área entram como hash/WKB)."""
+    hash_desenhos = hashlib.sha1(json.dumps(list(desenhos), sort_keys=True).encode("utf-8")).hexdigest()
+    return (
+        coluna_risco_rounded,
+        None if riscos is None else tuple(sorted(riscos)),
+        None if concessoes is None else tuple(sorted(concessoes, key=str)),
+        None if area is None else area.wkb,
+        distancia,
+        hash_desenhos,
+        todos_desenhos,
+    )
+
+
+class CacheFiltros:
+    """Memoização LRU de `aplicar_filtros`, compartilhável entre sessões (thread-safe).
+
+    Cada entrada guarda só o array de posições, não uma cópia dos hexágonos.
+    """
+
+    def __init__(self, tamanho_maximo=64):
+        self.tamanho_maximo = tamanho_maximo
+        self.acertos = 0
+        self.falhas = 0
+        self._entradas = OrderedDict()
+        self._trava = threading.Lock()
+
+    def filtrar(self, versao_camada, hexagonos_base, indices_concessao, coluna_risco_rounded, riscos=None,
+                concessoes=None, area=None, distancia=None, desenhos=(), todos_desenhos=True):
+        """Posições filtradas de `hexagonos_base`, em cache pela `versao_camada` e pelo estado dos filtros.
+
+        `versao_camada` é uma chave hashable que muda sempre que a camada ou a
+        pertinência às concessões muda (ver `dados.versao_camada`).
+        """
+        chave = (versao_camada,) + chave_filtros(
+            coluna_risco_rounded, riscos, concessoes, area, distancia, desenhos, todos_desenhos
+        )
+        with self._trava:
+            if chave in self._entradas:
+                self._entradas.move_to_end(chave)
+                self.acertos += 1
+                return self._entradas[chave]
+            self.falhas += 1
+
+        resultado = aplicar_filtros(
+            hexagonos_base, indices_concessao, coluna_risco_rounded, riscos, concessoes,
+            area, distancia, desenhos, todos_desenhos,
+        )
+        with self._trava:
+            self._entradas[chave] = resultado
+            while len(self._entradas) > self.tamanho_maximo:
+                self._entradas.popitem(last=False)
+        return resultado
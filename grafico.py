@@ -0,0 +1,94 @@
+# Distribuição das classes de risco para a aba "Gráfico de Riscos"
+import copy
+import functools
+
+import numpy as np
+import plotly.graph_objects as go
+
+CLASSES_RISCO = list(range(7))
+
+# Cores das classes de risco 0 a 6 (as mesmas do mapa)
+CORES_RISCO = ["#008000", "#7FFF00", "#FFFF00", "#FFBF00", "#FF8000", "#FF4000", "#FF0000"]
+
+
+def contagem_classes(classes):
+    """Contagem por classe 0-6 e, na última posição, valores fora dessa faixa (NaN é ignorado)."""
+    classes = np.asarray(classes, dtype=float)
+    classes = classes[~np.isnan(classes)].astype(np.int64)
+    dentro = (classes >= 0) & (classes < len(CLASSES_RISCO))
+    contagem = np.bincount(classes[dentro], minlength=len(CLASSES_RISCO))
+    return np.append(contagem, np.count_nonzero(~dentro))
+
+
+def percentuais(contagem):
+    """% de hexágonos em cada classe 0-6 (mesma normalização de `value_counts(normalize=True)`)."""
+    total = contagem.sum()
+    if total == 0:
+        return np.zeros(len(CLASSES_RISCO))
+    return 100.0 * contagem[: len(CLASSES_RISCO)] / total
+
+
+class CuboRiscos:
+    """Contagens pré-calculadas por (coluna de risco, conjunto de concessões, classe).
+
+    Os hexágonos são agrupados pela combinação exata de concessões que os
+    atravessam, então somar os grupos que contêm alguma concessão selecionada
+    conta cada hexágono uma única vez. Serve para os filtros de risco e de
+    concessão; filtros por coordenadas ou desenhos exigem o cálculo direto.
+    """
+
+    def __init__(self, hexagonos, indices_concessao, colunas):
+        self.empresas = sorted(indices_concessao)
+        membros = np.column_stack(
+            [hexagonos["index"].isin(indices_concessao[empresa]).to_numpy() for empresa in self.empresas]
+        ) if self.empresas else np.zeros((len(hexagonos), 0), dtype=bool)
+        self.assinaturas, grupo = np.unique(membros, axis=0, return_inverse=True)
+        grupo = grupo.ravel()
+
+        self.contagens = {}
+        for coluna in colunas:
+            self.contagens[coluna] = np.array([
+                contagem_classes(hexagonos[coluna].to_numpy()[grupo == g]) for g in range(len(self.assinaturas))
+            ]).reshape(len(self.assinaturas), len(CLASSES_RISCO) + 1)
+
+    def distribuicao(self, coluna, concessoes=None, riscos=None):
+        """% por classe para a seleção; None em `concessoes`/`riscos` significa todos."""
+        contagens = self.contagens[coluna]
+        if concessoes:
+            selecionadas = np.isin(self.empresas, list(concessoes))
+            contagens = contagens[self.assinaturas[:, selecionadas].any(axis=1)]
+        contagem = contagens.sum(axis=0)
+        if riscos is not None:
+            # Classes não selecionadas (e as fora de 0-6) saem do total, como no filtro
+            manter = np.isin(CLASSES_RISCO, list(riscos))
+            contagem = np.append(np.where(manter, contagem[: len(CLASSES_RISCO)], 0), 0)
+        return percentuais(contagem)
+
+
+@functools.lru_cache(maxsize=None)
+def _modelo_grafico(tipo_risco):
+    # Figura montada e validada uma vez por tipo de risco; por rerun só o y muda
+    fig = go.Figure(go.Bar(
+        x=CLASSES_RISCO,
+        y=[0] * len(CLASSES_RISCO),
+        marker_color=CORES_RISCO,
+        customdata=[f"Risco {classe}" for classe in CLASSES_RISCO],
+        hovertemplate="%{customdata}: %{y:.1f}%<extra></extra>",
+    ))
+    fig.update_layout(
+        title=dict(text=f"Distribuição de Risco ({tipo_risco})", font=dict(color="#0F2355")),
+        xaxis_title="Categoria de Risco",
+        yaxis_title="% em Hexágonos",
+        xaxis=dict(title=dict(font=dict(color='#0F2355')), tickfont=dict(color='#0F2355'), dtick=1),
+        yaxis=dict(title=dict(font=dict(color='#0F2355')), tickfont=dict(color='#0F2355')),
+        autosize=True,
+        showlegend=False,
+    )
+    return fig.to_dict()
+
+
+def grafico_riscos(percentual, tipo_risco):
+    """Gráfico de barras (um único trace, cor por classe) com os percentuais por classe."""
+    figura = copy.deepcopy(_modelo_grafico(tipo_risco))
+    figura["data"][0]["y"] = [float(valor) for valor in percentual]
+    return figura
@@ -0,0 +1,232 @@
+# Funções auxiliares do mapa folium do dashboard
+import json
+
+import folium
+from branca.colormap import StepColormap
+from branca.element import MacroElement
+from jinja2 import Template
+from folium import GeoJsonTooltip
+from folium.plugins import VectorGridProtobuf
+from shapely.geometry import box
+
+from grafico import CORES_RISCO
+from simplificacao import simplificar_camada
+
+RESOLUCAO_BASE = 6
+
+# Número máximo de hexágonos enviados ao navegador em uma renderização
+LIMITE_HEXAGONOS = 5000
+
+# Margem em volta da área visível, em fração da largura/altura, para pequenos pans não mostrarem bordas vazias
+MARGEM_VISTA = 0.25
+
+
+def resolucao_para_vista(zoom, resolucoes, contar, limite=LIMITE_HEXAGONOS):
+    """Resolução H3 a desenhar no `zoom` do Leaflet, com no máximo `limite` hexágonos.
+
+    O zoom 8 (padrão do mapa) corresponde à resolução 6 do H3.geojson; cada dois
+    níveis de zoom adicionam uma resolução. Enquanto `contar(resolucao)` passar
+    de `limite`, usa-se o nível mais grosso seguinte.
+    """
+    resolucoes = sorted(resolucoes)
+    if not resolucoes:
+        return RESOLUCAO_BASE
+    resolucao = min(max(int(zoom) // 2 + 2, resolucoes[0]), resolucoes[-1])
+    while resolucao > resolucoes[0] and contar(resolucao) > limite:
+        resolucao -= 1
+    return resolucao
+
+
+def resolucao_para_zoom(zoom, contagens, limite=LIMITE_HEXAGONOS):
+    """`resolucao_para_vista` com o total de células de cada nível ({resolucao: n})."""
+    return resolucao_para_vista(zoom, contagens, lambda resolucao: contagens.get(resolucao, 0), limite)
+
+
+def limites_vista(bounds, margem=MARGEM_VISTA):
+    """Retângulo da área visível (bounds retornado pelo st_folium) ampliado por `margem`; None se indefinido."""
+    try:
+        oeste, sul = bounds["_southWest"]["lng"], bounds["_southWest"]["lat"]
+        leste, norte = bounds["_northEast"]["lng"], bounds["_northEast"]["lat"]
+    except (KeyError, TypeError):
+        return None
+    if None in (oeste, sul, leste, norte):
+        return None
+    dx, dy = (leste - oeste) * margem, (norte - sul) * margem
+    return box(oeste - dx, sul - dy, leste + dx, norte + dy)
+
+
+# Classes de risco arredondadas por período, usadas no filtro feito no navegador
+COLUNAS_PERIODO = {"Diurno": "risk_mean_rounded_KmP", "Noturno": "risk_mean_rounded_KmP_dark"}
+
+
+def legenda_risco(tipo_risco=None):
+    return StepColormap(
+        CORES_RISCO,
+        index=list(range(len(CORES_RISCO) + 1)),
+        vmin=0,
+        vmax=len(CORES_RISCO),
+        caption="Risco Médio" if tipo_risco is None else f"Risco Médio ({tipo_risco})",
+    )
+
+
+def cor_risco(classe):
+    """Cor da classe de risco; cinza para valor ausente ou fora de 0-6, como em `contagem_classes`."""
+    if classe is None or classe != classe or not 0 <= classe < len(CORES_RISCO):
+        return "#808080"
+    return CORES_RISCO[int(classe)]
+
+
+def camada_hexagonos(hexagonos, coluna_risco_rounded, nome="Hexágonos Selecionados", zoom=None):
+    """Camada única com cor por classe de risco e tooltip.
+
+    Substitui o par Choropleth + GeoJson de tooltip, que serializava as mesmas
+    geometrias duas vezes. Com `zoom`, as geometrias são simplificadas e
+    quantizadas para esse nível antes de serializar.
+    """
+    def estilo(feature):
+        cor = cor_risco(feature["properties"][coluna_risco_rounded])
+        return {"fillColor": cor, "fillOpacity": 0.6, "color": "black", "weight": 1, "opacity": 0.2}
+
+    hexagonos = hexagonos[["index", coluna_risco_rounded, "geometry"]]
+    if zoom is not None:
+        hexagonos = simplificar_camada(hexagonos, zoom)
+
+    return folium.GeoJson(
+        hexagonos,
+        name=nome,
+        style_function=estilo,
+        highlight_function=lambda x: {"weight": 3, "fillOpacity": 0.8},
+        tooltip=GeoJsonTooltip(fields=[coluna_risco_rounded], aliases=["Risco:"], localize=True),
+    )
+
+
+def camada_hexagonos_navegador(hexagonos, nome="Hexágonos Selecionados", zoom=None):
+    """Camada com as classes diurna e noturna, estilizada por `FiltroRiscoNavegador`.
+
+    Não tem style_function: a cor depende do período escolhido no próprio mapa,
+    então a mesma camada serve para os dois períodos sem nova renderização.
+    """
+    colunas = list(COLUNAS_PERIODO.values())
+    hexagonos = hexagonos[["index"] + colunas + ["geometry"]]
+    if zoom is not None:
+        hexagonos = simplificar_camada(hexagonos, zoom)
+
+    return folium.GeoJson(
+        hexagonos,
+        name=nome,
+        highlight_function=lambda x: {"weight": 3, "fillOpacity": 0.8},
+        tooltip=GeoJsonTooltip(fields=colunas, aliases=[f"Risco {p.lower()}:" for p in COLUNAS_PERIODO], localize=True),
+    )
+
+
+class FiltroRiscoNavegador(MacroElement):
+    """Controle do Leaflet que escolhe o período e as classes de risco visíveis no navegador.
+
+    Troca a cor e esconde/mostra os hexágonos de `camada` sem falar com o
+    servidor: nenhuma execução do script nem recarga do iframe.
+    """
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        (function() {
+            var camada = {{ this.camada.get_name() }};
+            var hexagonos = camada.getLayers();
+            var cores = {{ this.cores|tojson }};
+            var colunas = {{ this.colunas|tojson }};
+
+            // A camada pode ser trocada sem recarregar o mapa (feature_group_to_add do st_folium):
+            // o controle anterior sai e a escolha feita no navegador é mantida
+            if (window.controleFiltroRisco) { window.controleFiltroRisco.remove(); }
+            var estado = window.estadoFiltroRisco;
+            if (!estado) {
+                estado = {coluna: colunas[{{ this.periodo|tojson }}], classes: {}};
+                cores.forEach(function(_, classe) { estado.classes[classe] = true; });
+                window.estadoFiltroRisco = estado;
+            }
+
+            function estilo(feature) {
+                var classe = feature.properties[estado.coluna];
+                return {
+                    fillColor: cores[classe] || "#808080",
+                    fillOpacity: 0.6, color: "black", weight: 1, opacity: 0.2
+                };
+            }
+
+            function aplicar() {
+                hexagonos.forEach(function(hexagono) {
+                    var classe = hexagono.feature.properties[estado.coluna];
+                    var visivel = classe === null || classe === undefined || estado.classes[classe];
+                    if (visivel && !camada.hasLayer(hexagono)) { camada.addLayer(hexagono); }
+                    if (!visivel && camada.hasLayer(hexagono)) { camada.removeLayer(hexagono); }
+                });
+                // resetStyle (fim do destaque) usa options.style
+                camada.options.style = estilo;
+                camada.setStyle(estilo);
+            }
+
+            var controle = L.control({position: "topright"});
+            controle.onAdd = function() {
+                var div = L.DomUtil.create("div", "leaflet-bar");
+                div.style.background = "white";
+                div.style.padding = "6px 8px";
+                var html = "<b>Período</b><br>";
+                Object.keys(colunas).forEach(function(periodo) {
+                    var marcado = colunas[periodo] === estado.coluna ? " checked" : "";
+                    html += '<label><input type="radio" name="periodo" value="' + periodo + '"' + marcado + "> "
+                        + periodo + "</label><br>";
+                });
+                html += "<b>Riscos</b><br>";
+                cores.forEach(function(cor, classe) {
+                    var marcado = estado.classes[classe] ? " checked" : "";
+                    html += '<label><input type="checkbox" value="' + classe + '"' + marcado + "> "
+                        + '<span style="background:' + cor + ';padding:0 6px;margin-right:4px"></span>Risco '
+                        + classe + "</label><br>";
+                });
+                div.innerHTML = html;
+                div.addEventListener("change", function(e) {
+                    if (e.target.type === "radio") { estado.coluna = colunas[e.target.value]; }
+                    else { estado.classes[e.target.value] = e.target.checked; }
+                    aplicar();
+                });
+                L.DomEvent.disableClickPropagation(div);
+                L.DomEvent.disableScrollPropagation(div);
+                return div;
+            };
+            controle.addTo({{ this.mapa.get_name() }});
+            window.controleFiltroRisco = controle;
+            aplicar();
+        })();
+        {% endmacro %}
+    """)
+
+    def __init__(self, camada, mapa, periodo="Diurno"):
+        super().__init__()
+        self._name = "FiltroRiscoNavegador"
+        self.camada = camada
+        self.mapa = mapa
+        self.periodo = periodo
+        self.cores = CORES_RISCO
+        self.colunas = COLUNAS_PERIODO
+
+
+def camada_tiles_hexagonos(url_base, coluna_risco_rounded, nome="Hexágonos (tiles)"):
+    """Hexágonos servidos como tiles vetoriais, coloridos pela classe de risco no navegador."""
+    opcoes = """{
+        "vectorTileLayerStyles": {
+            "hexagonos": function(propriedades) {
+                var cores = %s;
+                var classe = propriedades["%s"];
+                return {
+                    "fill": true, "fillColor": cores[classe] || "#808080",
+                    "fillOpacity": 0.6, "color": "black", "weight": 1, "opacity": 0.2
+                };
+            }
+        },
+        "maxNativeZoom": 14
+    }""" % (json.dumps(CORES_RISCO), coluna_risco_rounded)
+    return VectorGridProtobuf(f"{url_base}/hexagonos/{{z}}/{{x}}/{{y}}.pbf", nome, opcoes)
+
+
+def camada_tiles(url_base, camada, nome, estilo):
+    opcoes = {"vectorTileLayerStyles": {camada: estilo}, "maxNativeZoom": 14}
+    return VectorGridProtobuf(f"{url_base}/{camada}/{{z}}/{{x}}/{{y}}.pbf", nome, opcoes)
@@ -0,0 +1,79 @@
+# Pré-cálculo offline do risco dos hexágonos, separado do dashboard
+#
+# O dashboard (test_rj19.py) apenas lê os artefatos gerados aqui; rode este
+# comando sempre que Risco3.geojson ou H3.geojson mudarem.
+#
+# Uso: python -m risk_precompute --roads Risco3.geojson --hex H3.geojson [--piramide] [--parquet]
+import argparse
+import os
+import sys
+import time
+
+from agregacao_risco import COLUNAS_RISCO, METODOS
+from cache_risco import (
+    atualizar_hexagonos_com_risco,
+    atualizar_piramide_risco,
+    caminho_chave,
+    caminho_estado_incremental,
+)
+from camadas_parquet import converter_para_parquet
+
+
+def _forcar(caminho_saida):
+    # Sem a chave o artefato fica desatualizado, e sem o estado incremental
+    # (malha anterior + metadados) ele é recalculado por completo
+    for caminho in (caminho_chave(caminho_saida), *caminho_estado_incremental(caminho_saida)):
+        if os.path.exists(caminho):
+            os.remove(caminho)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pré-calcula o risco médio dos hexágonos H3 a partir da malha viária")
+    parser.add_argument("--roads", default="Risco3.geojson", help="malha viária com KmP/KmP_dark")
+    parser.add_argument("--hex", default="H3.geojson", help="hexágonos H3 da camada base")
+    parser.add_argument("--saida", default="hexagonos_h3_com_risco.geojson")
+    parser.add_argument("--metodo", choices=sorted(METODOS), default="comprimento")
+    parser.add_argument("--id", default="id", help="coluna de id dos segmentos, para recálculo incremental")
+    parser.add_argument("--piramide", action="store_true", help="gera também piramide_h3_risco.geojson")
+    parser.add_argument("--parquet", action="store_true", help="gera também cópias GeoParquet das camadas")
+    parser.add_argument("--forcar", action="store_true", help="recalcula mesmo se o artefato estiver atualizado")
+    args = parser.parse_args(argv)
+
+    for caminho in (args.roads, args.hex):
+        if not os.path.exists(caminho):
+            print(f"{caminho}: não encontrado", file=sys.stderr)
+            return 1
+
+    if args.forcar:
+        _forcar(args.saida)
+    inicio = time.perf_counter()
+    resultado = atualizar_hexagonos_com_risco(
+        args.roads, args.hex, args.saida, COLUNAS_RISCO, metodo=args.metodo, coluna_id=args.id
+    )
+    if resultado is None:
+        print(f"{args.saida}: já atualizado")
+    else:
+        print(f"{args.saida}: {len(resultado)} hexágonos em {time.perf_counter() - inicio:.1f} s")
+
+    if args.piramide:
+        caminho_piramide = "piramide_h3_risco.geojson"
+        if args.forcar:
+            _forcar(caminho_piramide)
+        inicio = time.perf_counter()
+        piramide = atualizar_piramide_risco(
+            args.roads, args.hex, caminho_piramide, colunas=COLUNAS_RISCO, metodo=args.metodo
+        )
+        if piramide is None:
+            print(f"{caminho_piramide}: já atualizado")
+        else:
+            print(f"{caminho_piramide}: gerado em {time.perf_counter() - inicio:.1f} s")
+
+    if args.parquet:
+        for caminho in (args.roads, args.hex, "AU.geojson"):
+            if os.path.exists(caminho):
+                print(f"{caminho} -> {converter_para_parquet(caminho)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+# Simplificação e quantização das geometrias enviadas ao mapa
+#
+# A tolerância segue o tamanho do pixel no zoom do Leaflet e as coordenadas são
+# arredondadas para uma grade de 10^-precisao graus, o que encurta o GeoJSON
+# (o H3.geojson guarda 15 casas decimais).
+#
+# Uso: python simplificacao.py [--zoom 8] [--precisao 5]   (relatório por camada)
+import argparse
+import math
+import os
+
+import geopandas as gpd
+import numpy as np
+import shapely
+
+# Metros por grau de latitude (aproximação usada nos relatórios de erro)
+METROS_POR_GRAU = 111320.0
+
+
+def tamanho_pixel(zoom):
+    """Largura aproximada de um pixel, em graus, no `zoom` do Leaflet (tiles de 256 px)."""
+    return 360.0 / (256 * 2 ** zoom)
+
+
+def precisao_para_zoom(zoom):
+    """Casas decimais suficientes para ~1/10 de pixel no `zoom`."""
+    return max(0, math.ceil(-math.log10(tamanho_pixel(zoom) / 10)))
+
+
+def simplificar_geometrias(geometrias, zoom, precisao=None, fracao_pixel=0.5):
+    """Simplifica (`fracao_pixel` de tolerância) e quantiza um array de geometrias."""
+    if precisao is None:
+        precisao = precisao_para_zoom(zoom)
+    simplificadas = shapely.simplify(geometrias, fracao_pixel * tamanho_pixel(zoom), preserve_topology=True)
+    return shapely.set_precision(simplificadas, 10.0 ** -precisao)
+
+
+def simplificar_camada(gdf, zoom, precisao=None, fracao_pixel=0.5):
+    """Cópia de `gdf` com as geometrias simplificadas para o `zoom`."""
+    resultado = gdf.copy()
+    resultado.geometry = gpd.GeoSeries(
+        simplificar_geometrias(gdf.geometry.values, zoom, precisao, fracao_pixel), index=gdf.index, crs=gdf.crs
+    )
+    return resultado
+
+
+def relatorio(gdf, zoom, precisao=None):
+    """Bytes do GeoJSON antes/depois e erro máximo (distância de Hausdorff, em metros)."""
+    simplificada = simplificar_camada(gdf, zoom, precisao)
+    bytes_antes = len(gdf.to_json().encode("utf-8"))
+    bytes_depois = len(simplificada.to_json().encode("utf-8"))
+    erro = shapely.hausdorff_distance(gdf.geometry.values, simplificada.geometry.values)
+    return {
+        "bytes_antes": bytes_antes,
+        "bytes_depois": bytes_depois,
+        "reducao": 1 - bytes_depois / bytes_antes,
+        "erro_maximo_m": float(np.nanmax(erro)) * METROS_POR_GRAU if len(erro) else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Relatório de simplificação das camadas do mapa")
+    parser.add_argument("--zoom", type=int, nargs="+", default=[8, 11, 14])
+    parser.add_argument("--precisao", type=int, default=None)
+    parser.add_argument(
+        "camadas", nargs="*", default=["hexagonos_h3_com_risco.geojson", "Risco3.geojson", "AU.geojson"]
+    )
+    args = parser.parse_args()
+
+    for caminho in args.camadas:
+        if not os.path.exists(caminho):
+            print(f"{caminho}: não encontrado, ignorado")
+            continue
+        gdf = gpd.read_file(caminho)
+        for zoom in args.zoom:
+            r = relatorio(gdf, zoom, args.precisao)
+            precisao = args.precisao if args.precisao is not None else precisao_para_zoom(zoom)
+            print(
+                f"{caminho:32s} zoom {zoom:2d} ({precisao} casas): "
+                f"{r['bytes_antes'] / 1e3:9.1f} kB -> {r['bytes_depois'] / 1e3:9.1f} kB "
+                f"(-{r['reducao']:.1%}), erro máximo {r['erro_maximo_m']:.1f} m"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,45 @@
 # Importações necessárias
 import streamlit as st
-import geopandas as gpd
+import numpy as np
 import folium
-from folium import Choropleth, LayerControl, GeoJsonTooltip
+from folium import LayerControl
 from folium.plugins import Draw
-from shapely.geometry import shape, box
+from shapely.geometry import Point, box
 from streamlit_folium import st_folium
-import plotly.graph_objects as go
 from folium.plugins import MiniMap
+from dados import (
+    cache_filtros,
+    carregar_areas_urbanas,
+    carregar_cubo_riscos,
+    carregar_hexagonos_com_risco,
+    carregar_indices_concessoes,
+    carregar_malha_viaria,
+    carregar_nivel_piramide,
+    contagem_piramide,
+    hexagonos_com_risco_disponiveis,
+    iniciar_servidor_tiles,
+    versao_camada,
+)
+from filtros import posicoes_na_geometria
+from grafico import contagem_classes, grafico_riscos, percentuais
+from mapa import (
+    COLUNAS_PERIODO,
+    RESOLUCAO_BASE,
+    FiltroRiscoNavegador,
+    camada_hexagonos,
+    camada_hexagonos_navegador,
+    camada_tiles,
+    camada_tiles_hexagonos,
+    legenda_risco,
+    limites_vista,
+    resolucao_para_vista,
+    resolucao_para_zoom,
+)
+from simplificacao import simplificar_camada
+
+# Vista inicial do mapa; depois dela, pan e zoom ficam só no navegador
+CENTRO_INICIAL = [-22.90, -43.20]
+ZOOM_INICIAL = 8
 
 # Configuração do Streamlit
 st.set_page_config(page_title="Dashboard Interativo - Risco de Atropelamento", layout="wide")
@@ -226,33 +258,20 @@ st.markdown(
     unsafe_allow_html=True
 )
 
-# Criação das abas
-tabs = st.tabs(["Mapa Interativo", "Gráfico de Riscos"])
-
-# Carregar dados
-malha_viaria = gpd.read_file('Risco3.geojson')
-hexagonos_h3 = gpd.read_file('H3.geojson')
-areas_urbanas = gpd.read_file('AU.geojson')
-
-# Calcular riscos para ambos os tipos (diurno e noturno)
-if 'risk_mean_KmP' not in hexagonos_h3.columns or 'risk_mean_KmP_dark' not in hexagonos_h3.columns:
-    for index, row in hexagonos_h3.iterrows():
-        segmentos_no_hex = malha_viaria[malha_viaria.intersects(row.geometry)]
+# Criação das abas (só a aba aberta é executada; trocar de aba reexecuta o script)
+aba_mapa, aba_grafico = st.tabs(["Mapa Interativo", "Gráfico de Riscos"], key="aba", on_change="rerun")
 
-        if not segmentos_no_hex.empty:
-            hexagonos_h3.loc[index, 'risk_mean_KmP'] = segmentos_no_hex['KmP'].mean()
-            hexagonos_h3.loc[index, 'risk_mean_rounded_KmP'] = segmentos_no_hex['KmP'].mean().round()
-            hexagonos_h3.loc[index, 'risk_mean_KmP_dark'] = segmentos_no_hex['KmP_dark'].mean()
-            hexagonos_h3.loc[index, 'risk_mean_rounded_KmP_dark'] = segmentos_no_hex['KmP_dark'].mean().round()
-        else:
-            hexagonos_h3.loc[index, 'risk_mean_KmP'] = 0
-            hexagonos_h3.loc[index, 'risk_mean_rounded_KmP'] = 0
-            hexagonos_h3.loc[index, 'risk_mean_KmP_dark'] = 0
-            hexagonos_h3.loc[index, 'risk_mean_rounded_KmP_dark'] = 0
-
-    hexagonos_h3.to_file('hexagonos_h3_com_risco.geojson', driver='GeoJSON')
+# O risco dos hexágonos é pré-calculado offline; o dashboard só lê o artefato
+if not hexagonos_com_risco_disponiveis():
+    st.error(
+        "O arquivo hexagonos_h3_com_risco.geojson está ausente ou desatualizado em relação a "
+        "Risco3.geojson/H3.geojson. Gere-o com `python -m risk_precompute --roads Risco3.geojson --hex H3.geojson`."
+    )
+    st.stop()
 
-hexagonos_h3 = gpd.read_file('hexagonos_h3_com_risco.geojson')
+# Carregar dados (uma vez por processo, compartilhados entre sessões)
+malha_viaria = carregar_malha_viaria(colunas=["empresa"])
+areas_urbanas = carregar_areas_urbanas()
 
 # Escolha do tipo de risco pelo usuário
 st.sidebar.header("Configurações de Risco")
@@ -274,7 +293,28 @@ selected_concessions = st.sidebar.multiselect(
     ["Selecionar todos"] + concessions_list,
     default=["Selecionar todos"]
 )
+combinacao_desenhos = st.sidebar.radio(
+    "Filtro por Desenhos:", ["Todos os desenhos (E)", "Qualquer desenho (OU)"], index=0
+)
 show_areas_urbanas = st.sidebar.selectbox("Áreas Urbanas:", ["Mostrar", "Esconder"], index=1)
+modo_mapa = st.sidebar.selectbox("Modo do Mapa:", ["GeoJSON", "Tiles vetoriais", "Filtro no navegador"], index=0)
+acompanhar_vista = st.sidebar.checkbox(
+    "Acompanhar a vista do mapa", value=False,
+    help="Envia só os hexágonos da área visível e ajusta a resolução ao zoom; cada pan/zoom recarrega o mapa.",
+)
+if modo_mapa == "Tiles vetoriais":
+    st.sidebar.caption("No modo de tiles vetoriais o mapa mostra todos os hexágonos; os filtros valem para o gráfico.")
+elif modo_mapa == "Filtro no navegador":
+    st.sidebar.caption(
+        "Neste modo, período e classes de risco do mapa são escolhidos no controle do próprio mapa, "
+        "sem recarregar a página; os da barra lateral valem para o gráfico."
+    )
+
+# Riscos por hexágono, só com a coluna usada (as duas no filtro feito no navegador)
+filtro_navegador = modo_mapa == "Filtro no navegador"
+colunas_hexagonos = ["index"] + (list(COLUNAS_PERIODO.values()) if filtro_navegador else [coluna_risco_rounded])
+riscos_selecionados = None if "Selecionar todos" in selected_risks else [int(r.split()[1]) for r in selected_risks]
+concessoes_selecionadas = None if "Selecionar todos" in selected_concessions else selected_concessions
 
 # Filtro por coordenadas
 st.sidebar.header("Filtrar por Coordenadas")
@@ -283,6 +323,7 @@ pair_2 = st.sidebar.text_input("Coordenadas Finais (Latitude, Longitude - opcion
 
 usar_filtro_coordenadas = False
 bbox = None
+distancia_bbox = None
 if pair_1:
     try:
         lat_ini, lon_ini = map(float, pair_1.split(","))
@@ -290,37 +331,91 @@ if pair_1:
             lat_fim, lon_fim = map(float, pair_2.split(","))
             bbox = box(min(lon_ini, lon_fim), min(lat_ini, lat_fim), max(lon_ini, lon_fim), max(lat_ini, lat_fim))
         else:
-            bbox = Point(lon_ini, lat_ini).buffer(0.01)  # Pequena área ao redor do ponto
+            bbox = Point(lon_ini, lat_ini)
+            distancia_bbox = 0.01  # Pequena área ao redor do ponto
         usar_filtro_coordenadas = True
     except ValueError:
         st.sidebar.error("Erro: Insira coordenadas válidas.")
 
-# Aba 1: Mapa Interativo
-with tabs[0]:
-    st.header("Mapa Interativo")
-    
-    # Inicializar estado na sessão
-    if "map_center" not in st.session_state:
-        st.session_state["map_center"] = [-22.90, -43.20]  # Centro padrão
-    if "map_zoom" not in st.session_state:
-        st.session_state["map_zoom"] = 8  # Zoom padrão inicial
-    if "all_drawings" not in st.session_state:
-        st.session_state["all_drawings"] = []  # Inicializar desenhos como lista vazia
-    desenhos = st.session_state.get("all_drawings", [])  # Recuperar desenhos
-
-    # **🔹 Garantir que `map_center` esteja no formato correto (lista)**
-    if isinstance(st.session_state["map_center"], dict):  
-        st.session_state["map_center"] = [
-            st.session_state["map_center"].get("lat", -22.90),
-            st.session_state["map_center"].get("lng", -43.20)
-        ]
-    
-    # Inicializar mapa
-    m = folium.Map(
-        location=st.session_state["map_center"],
-        zoom_start=st.session_state["map_zoom"],
-        tiles="OpenStreetMap"
+# Inicializar estado na sessão
+if "map_zoom" not in st.session_state:
+    st.session_state["map_zoom"] = ZOOM_INICIAL
+if "all_drawings" not in st.session_state:
+    st.session_state["all_drawings"] = []  # Inicializar desenhos como lista vazia
+chave_mapa = f"mapa_{modo_mapa}"
+
+
+def camada_h3(resolucao):
+    """Hexágonos de uma resolução H3 (base ou nível da pirâmide) e sua pertinência às concessões."""
+    if resolucao == RESOLUCAO_BASE:
+        return carregar_hexagonos_com_risco(colunas=colunas_hexagonos), carregar_indices_concessoes(None)
+    return carregar_nivel_piramide(resolucao, colunas=colunas_hexagonos), carregar_indices_concessoes(resolucao)
+
+
+def filtrar_hexagonos(resolucao, coluna, riscos):
+    # Memoizado pela versão da camada e pelo estado completo dos filtros, compartilhado entre mapa, gráfico e
+    # sessões. O resultado são posições na camada; o subconjunto só é montado para desenhar.
+    hexagonos, indices_concessao = camada_h3(resolucao)
+    return cache_filtros().filtrar(
+        versao_camada(None if resolucao == RESOLUCAO_BASE else resolucao),
+        hexagonos,
+        indices_concessao,
+        coluna,
+        riscos=riscos,
+        concessoes=concessoes_selecionadas,
+        area=bbox if usar_filtro_coordenadas else None,
+        distancia=distancia_bbox,
+        desenhos=st.session_state["all_drawings"],
+        todos_desenhos=combinacao_desenhos == "Todos os desenhos (E)",
     )
+
+
+def contagens_resolucao():
+    return {**contagem_piramide(), RESOLUCAO_BASE: len(carregar_hexagonos_com_risco(colunas=colunas_hexagonos))}
+
+
+@st.fragment
+def fragmento_mapa():
+    """Mapa; um novo desenho reexecuta só este trecho."""
+    # Retorno do st_folium guardado pela chave do mapa (desenhos e, se pedido, zoom e área visível)
+    estado_mapa = st.session_state.get(chave_mapa) or {}
+    if estado_mapa.get("all_drawings"):
+        st.session_state["all_drawings"] = estado_mapa["all_drawings"]  # 🔹 **Manter TODOS os desenhos**
+    if acompanhar_vista and estado_mapa.get("zoom"):
+        st.session_state["map_zoom"] = estado_mapa["zoom"]
+    zoom = st.session_state["map_zoom"]
+    # Tiles vetoriais já trazem só a área visível
+    vista = None
+    if acompanhar_vista and modo_mapa != "Tiles vetoriais":
+        vista = limites_vista(estado_mapa.get("bounds"))
+
+    # No filtro feito no navegador, risco e período ficam fora do filtro do servidor
+    coluna_filtro = COLUNAS_PERIODO["Diurno"] if filtro_navegador else coluna_risco_rounded
+    riscos_filtro = None if filtro_navegador else riscos_selecionados
+    posicoes_por_resolucao = {}
+
+    def posicoes_visiveis(resolucao):
+        # Hexágonos filtrados dentro da área visível (com margem), via STRtree da camada
+        if resolucao not in posicoes_por_resolucao:
+            posicoes = filtrar_hexagonos(resolucao, coluna_filtro, riscos_filtro)
+            if vista is not None:
+                hexagonos, _ = camada_h3(resolucao)
+                posicoes = np.intersect1d(posicoes, posicoes_na_geometria(hexagonos, vista), assume_unique=True)
+            posicoes_por_resolucao[resolucao] = posicoes
+        return posicoes_por_resolucao[resolucao]
+
+    # Sem a vista, o limite vale para o nível inteiro; com ela, só para o que está visível
+    if vista is None:
+        resolucao = resolucao_para_zoom(zoom, contagens_resolucao())
+    else:
+        resolucao = resolucao_para_vista(zoom, contagens_resolucao(), lambda r: len(posicoes_visiveis(r)))
+    hexagonos_h3, _ = camada_h3(resolucao)
+
+    st.header("Mapa Interativo")
+
+    # Mapa base fixo (muda só com o modo): filtros trocam apenas as camadas, sem
+    # recarregar o iframe nem perder a vista atual do usuário
+    m = folium.Map(location=CENTRO_INICIAL, zoom_start=ZOOM_INICIAL, tiles="OpenStreetMap")
     draw = Draw(
         export=True,
         draw_options={
@@ -335,6 +430,7 @@ with tabs[0]:
     )
     draw.add_to(m)
     MiniMap(toggle_display=True).add_to(m)
+    legenda_risco("Diurno/Noturno" if filtro_navegador else None).add_to(m)
 
     # Criar botão fixo para limpar desenhos
     st.markdown(
@@ -372,118 +468,83 @@ with tabs[0]:
         unsafe_allow_html=True
     )
 
-    # Aplicar filtros
-    hexagonos_filtrados = hexagonos_h3.copy()
-
-    if usar_filtro_coordenadas:
-        hexagonos_filtrados = hexagonos_filtrados[hexagonos_filtrados.intersects(bbox)]
-
-    if "Selecionar todos" not in selected_risks:
-        selected_risk_values = [int(r.split()[1]) for r in selected_risks]
-        hexagonos_filtrados = hexagonos_filtrados[
-            hexagonos_filtrados[coluna_risco_rounded].isin(selected_risk_values)
-        ]
-
-    if "Selecionar todos" not in selected_concessions:
-        segmentos_filtrados = malha_viaria[malha_viaria['empresa'].isin(selected_concessions)]
-        if not segmentos_filtrados.empty:
-            hexagonos_filtrados = hexagonos_filtrados[
-                hexagonos_filtrados.intersects(segmentos_filtrados.unary_union)
-            ]
-
-    # Aplicar filtro por desenho, se houver
-    if desenhos:
-        for desenho in desenhos:  # Garantir que todos os desenhos anteriores sejam considerados
-            geometria = shape(desenho["geometry"])
-            hexagonos_filtrados = hexagonos_filtrados[hexagonos_filtrados.intersects(geometria)]
-            
-    # Adicionar hexágonos filtrados ao mapa
-    if not hexagonos_filtrados.empty:
-        Choropleth(
-            geo_data=hexagonos_filtrados,
-            data=hexagonos_filtrados,
-            columns=["index", coluna_risco_rounded],
-            key_on="feature.properties.index",
-            fill_color="RdYlGn_r",
-            fill_opacity=0.6,
-            line_opacity=0.2,
-            legend_name=f"Risco Médio ({tipo_risco})",
-            name="Hexágonos Selecionados",
-            highlight=True,
-        ).add_to(m)
-
-        folium.GeoJson(
-            hexagonos_filtrados,
-            name="Hexágonos",
-            style_function=lambda x: {
-                'color': 'lightgray',
-                'weight': 0.3,
-                'fillOpacity': 0
-            },
-            tooltip=GeoJsonTooltip(fields=[coluna_risco_rounded], aliases=['Risco:'], localize=True),
-        ).add_to(m)
+    # Camadas dinâmicas, enviadas ao mapa já montado (feature_group_to_add)
+    camada_hexagonos_mapa = folium.FeatureGroup(name="Hexágonos Selecionados")
+    camadas_mapa = [camada_hexagonos_mapa]
+    if filtro_navegador:
+        # Mesmos hexágonos para qualquer período/classe: risco e período são filtrados no navegador
+        camada = camada_hexagonos_navegador(hexagonos_h3.iloc[posicoes_visiveis(resolucao)], zoom=zoom)
+        camada.add_to(camada_hexagonos_mapa)
+        FiltroRiscoNavegador(camada, m, tipo_risco).add_to(camada_hexagonos_mapa)
+    elif modo_mapa == "Tiles vetoriais":
+        # Camadas servidas como tiles pelo servidor local; o navegador baixa só os tiles visíveis
+        url_tiles = iniciar_servidor_tiles()
+        camada_tiles_hexagonos(url_tiles, coluna_risco_rounded).add_to(camada_hexagonos_mapa)
+        camada_malha = folium.FeatureGroup(name="Malha Viária")
+        camada_tiles(url_tiles, "malha", "Malha Viária", {"color": "#0F2355", "weight": 1}).add_to(camada_malha)
+        camadas_mapa.append(camada_malha)
+    else:
+        # Adicionar hexágonos filtrados ao mapa (uma única camada com cor e tooltip)
+        posicoes_filtradas = posicoes_visiveis(resolucao)
+        if len(posicoes_filtradas):
+            camada_hexagonos(
+                hexagonos_h3.iloc[posicoes_filtradas], coluna_risco_rounded, zoom=zoom
+            ).add_to(camada_hexagonos_mapa)
 
     if show_areas_urbanas == "Mostrar":
-        folium.GeoJson(
-            areas_urbanas,
-            name="Áreas Urbanas",
-            style_function=lambda x: {'color': 'gray', 'weight': 1, 'fillOpacity': 0.5},
-        ).add_to(m)
-
-    # Adicionar controle de camadas
-    LayerControl().add_to(m)
-
-    # Renderizar o mapa final (apenas uma vez)
-    map_data = st_folium(m, width=None, height=600)  # Chamada única e definitiva
-
-    # Atualizar o estado da sessão com os dados do mapa
-    if map_data:
-        # Garantir que `map_center` seja uma lista
-        new_center = map_data.get("center", st.session_state["map_center"])
-        if isinstance(new_center, dict):
-            new_center = [new_center.get("lat", -22.90), new_center.get("lng", -43.20)]
-        st.session_state["map_center"] = new_center
-
-        # Atualizar zoom
-        st.session_state["map_zoom"] = map_data.get("zoom", st.session_state["map_zoom"])
-
-        # 🔹 **Manter TODOS os desenhos**
-        novos_desenhos = map_data.get("all_drawings", [])
-        if novos_desenhos:
-            st.session_state["all_drawings"] = novos_desenhos
-   
-# Aba 2: Gráfico
-with tabs[1]:
-    st.header("Gráfico de Riscos")
-    risco_percentual_filtrado = (
-        hexagonos_filtrados[coluna_risco_rounded]
-        .value_counts(normalize=True)
-        .reindex(range(7), fill_value=0)
-        .reset_index()
-    )
-    risco_percentual_filtrado.columns = ["Categoria de Risco", "%"]
-    risco_percentual_filtrado["%"] *= 100
-
-    fig = go.Figure()
-    cores = ["#008000", "#7FFF00", "#FFFF00", "#FFBF00", "#FF8000", "#FF4000", "#FF0000"]
-
-    for i, cor in enumerate(cores):
-        fig.add_trace(go.Bar(
-            x=[risco_percentual_filtrado.loc[i, 'Categoria de Risco']],
-            y=[risco_percentual_filtrado.loc[i, '%']],
-            name=f"Risco {i}",
-            marker_color=cor
-        ))
-
-    fig.update_layout(
-        title=dict(text=f"Distribuição de Risco ({tipo_risco})", font=dict(color="#0F2355")),
-        xaxis_title="Categoria de Risco",
-        yaxis_title="% em Hexágonos",
-        xaxis=dict(title=dict(font=dict(color='#0F2355')), tickfont=dict(color='#0F2355')),
-        yaxis=dict(title=dict(font=dict(color='#0F2355')), tickfont=dict(color='#0F2355')),
-        autosize=True,
-        barmode="group",
-        legend=dict(title=dict(font=dict(color='#0F2355')), font=dict(color='#0F2355'))
+        camada_areas_urbanas = folium.FeatureGroup(name="Áreas Urbanas")
+        if modo_mapa == "Tiles vetoriais":
+            camada_tiles(
+                url_tiles, "areas_urbanas", "Áreas Urbanas",
+                {"fill": True, "color": "gray", "weight": 1, "fillColor": "gray", "fillOpacity": 0.5},
+            ).add_to(camada_areas_urbanas)
+        else:
+            folium.GeoJson(
+                simplificar_camada(areas_urbanas, zoom),
+                name="Áreas Urbanas",
+                style_function=lambda x: {'color': 'gray', 'weight': 1, 'fillOpacity': 0.5},
+            ).add_to(camada_areas_urbanas)
+        camadas_mapa.append(camada_areas_urbanas)
+
+    # Só desenhos (e, se pedido, zoom e área visível) voltam ao servidor: pan, cliques e zoom não reexecutam nada
+    st_folium(
+        m,
+        key=chave_mapa,
+        width=None,
+        height=600,
+        returned_objects=["all_drawings", "zoom", "bounds"] if acompanhar_vista else ["all_drawings"],
+        feature_group_to_add=camadas_mapa,
+        layer_control=LayerControl(),
     )
 
+
+@st.fragment
+def fragmento_grafico():
+    """Gráfico de riscos; reexecuta sem reconstruir o mapa."""
+    st.header("Gráfico de Riscos")
+    # Sempre na camada base: as proporções não dependem do zoom do mapa
+    hexagonos_h3, _ = camada_h3(RESOLUCAO_BASE)
+    if usar_filtro_coordenadas or st.session_state["all_drawings"]:
+        # Filtros espaciais: contagem direta sobre os hexágonos filtrados (mesmo resultado em cache do mapa)
+        posicoes_filtradas = filtrar_hexagonos(RESOLUCAO_BASE, coluna_risco_rounded, riscos_selecionados)
+        classes = hexagonos_h3[coluna_risco_rounded].to_numpy()[posicoes_filtradas]
+        percentual = percentuais(contagem_classes(classes))
+    else:
+        # Só filtros de risco/concessão: soma de contagens pré-calculadas
+        cubo_riscos = carregar_cubo_riscos()
+        percentual = cubo_riscos.distribuicao(coluna_risco_rounded, concessoes_selecionadas, riscos_selecionados)
+
+    fig = grafico_riscos(percentual, tipo_risco)
+
     st.plotly_chart(fig, use_container_width=True)
+
+
+# Aba 1: Mapa Interativo
+if aba_mapa.open:
+    with aba_mapa:
+        fragmento_mapa()
+
+# Aba 2: Gráfico
+if aba_grafico.open:
+    with aba_grafico:
+        fragmento_grafico()
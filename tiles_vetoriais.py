@@ -0,0 +1,98 @@
+# Modo de tiles vetoriais (Mapbox Vector Tiles) para as camadas do mapa
+#
+# As camadas são projetadas em Web Mercator uma vez e cada tile é recortado sob
+# demanda pelo índice espacial, codificado em MVT e guardado em um LRU. Um
+# servidor HTTP local (thread daemon) atende [/v<versao>]/<camada>/<z>/<x>/<y>.pbf,
+# e o mapa consome os tiles com Leaflet.VectorGrid, baixando só o que está
+# visível. A versão na URL muda quando as camadas mudam, então o navegador pode
+# manter os tiles em cache sem mostrar dados antigos.
+import functools
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import mapbox_vector_tile
+import numpy as np
+import shapely
+
+EXTENSAO = 4096
+# Margem em torno do tile (em unidades do tile) para evitar cortes visíveis nas bordas
+MARGEM = 64
+LIMITE_MERCATOR = 20037508.342789244
+
+
+def limites_tile(z, x, y):
+    """Limites (minx, miny, maxx, maxy) do tile z/x/y em EPSG:3857."""
+    tamanho = 2 * LIMITE_MERCATOR / 2 ** z
+    minx = -LIMITE_MERCATOR + x * tamanho
+    maxy = LIMITE_MERCATOR - y * tamanho
+    return minx, maxy - tamanho, minx + tamanho, maxy
+
+
+class FonteTiles:
+    """Gera tiles MVT a partir de GeoDataFrames ({nome da camada: gdf})."""
+
+    def __init__(self, camadas, tamanho_cache=4096):
+        self.camadas = {}
+        for nome, gdf in camadas.items():
+            gdf = gdf.to_crs(3857).reset_index(drop=True)
+            gdf.sindex  # constrói o índice agora, fora das requisições
+            self.camadas[nome] = gdf
+        self.gerar_tile = functools.lru_cache(maxsize=tamanho_cache)(self._gerar_tile)
+
+    def _gerar_tile(self, nome, z, x, y):
+        gdf = self.camadas[nome]
+        limites = limites_tile(z, x, y)
+        margem = (limites[2] - limites[0]) * MARGEM / EXTENSAO
+        recorte = (limites[0] - margem, limites[1] - margem, limites[2] + margem, limites[3] + margem)
+
+        idx = gdf.sindex.query(shapely.box(*recorte), predicate="intersects")
+        if len(idx) == 0:
+            return b""
+
+        subconjunto = gdf.iloc[np.sort(idx)]
+        geometrias = shapely.clip_by_rect(subconjunto.geometry.values, *recorte)
+        # Detalhes menores que uma unidade do tile não aparecem depois da quantização
+        geometrias = shapely.simplify(geometrias, (limites[2] - limites[0]) / EXTENSAO, preserve_topology=True)
+        propriedades = subconjunto.drop(columns=subconjunto.geometry.name).to_dict("records")
+        feicoes = [
+            {"geometry": geometria, "properties": {k: v for k, v in props.items() if v is not None}}
+            for geometria, props in zip(geometrias, propriedades)
+            if not geometria.is_empty
+        ]
+        return mapbox_vector_tile.encode(
+            [{"name": nome, "features": feicoes}],
+            default_options={"quantize_bounds": limites, "extents": EXTENSAO},
+        )
+
+
+class _ManipuladorTiles(BaseHTTPRequestHandler):
+    fonte = None
+    # O prefixo /v<versao> só serve para invalidar o cache do navegador
+    padrao = re.compile(r"(?:/v\w+)?/(\w+)/(\d+)/(\d+)/(\d+)\.pbf")
+
+    def do_GET(self):
+        correspondencia = self.padrao.fullmatch(self.path.split("?")[0])
+        if not correspondencia or correspondencia.group(1) not in self.fonte.camadas:
+            self.send_error(404)
+            return
+        nome, z, x, y = correspondencia.group(1), *map(int, correspondencia.groups()[1:])
+        conteudo = self.fonte.gerar_tile(nome, z, x, y)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/vnd.mapbox-vector-tile")
+        self.send_header("Content-Length", str(len(conteudo)))
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.send_header("Cache-Control", "public, max-age=3600")
+        self.end_headers()
+        self.wfile.write(conteudo)
+
+    def log_message(self, formato, *args):
+        pass
+
+
+def iniciar_servidor(fonte, host="127.0.0.1", porta=8765):
+    """Inicia o servidor de tiles em uma thread daemon e retorna o servidor."""
+    manipulador = type("ManipuladorTiles", (_ManipuladorTiles,), {"fonte": fonte})
+    servidor = ThreadingHTTPServer((host, porta), manipulador)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor